@@ -0,0 +1,128 @@
+"""
+批量 API 路由定义
+将多个规则增删改请求合并为一次调用，整批只读写一次配置文件并重载一次 Nginx
+"""
+import asyncio
+import logging
+import re
+from fastapi import APIRouter, Depends, status
+from pydantic import ValidationError
+from app.models import (
+    ProxyRule,
+    ProxyRuleCreate,
+    ProxyRuleUpdate,
+    BatchRequest,
+    BatchResponse,
+    BatchResponseItem
+)
+from app.config_manager import ConfigManager
+from app.nginx_manager import NginxManager
+from app.api.routes import get_config_manager, get_nginx_manager
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+
+router = APIRouter(prefix="/api", tags=["proxy"])
+
+# 支持的子请求路径：/api/rules 或 /api/rules/{rule_id}
+RULE_URL_PATTERN = re.compile(r"^/api/rules(?:/([^/?]+))?/?(?:\?.*)?$")
+
+
+def _parse_operation(method: str, url: str, body: dict) -> tuple:
+    """将子请求解析为 ConfigManager.apply_batch 的操作，不支持的请求抛出 ValueError"""
+    match = RULE_URL_PATTERN.match(url)
+    if not match:
+        raise ValueError(f"不支持的批量请求路径: {url}")
+    rule_id = match.group(1)
+
+    if method == "POST" and rule_id is None:
+        rule_data = ProxyRuleCreate(**(body or {}))
+        return ("add", ProxyRule(**rule_data.model_dump()))
+    if method == "PUT" and rule_id is not None:
+        rule_data = ProxyRuleUpdate(**(body or {}))
+        return ("update", rule_id, rule_data.model_dump(exclude_none=True))
+    if method == "DELETE" and rule_id is not None:
+        return ("delete", rule_id)
+
+    raise ValueError(f"不支持的批量请求: {method} {url}")
+
+
+def _error_status(error: ValueError) -> int:
+    """按照单条接口的约定将操作失败映射为 HTTP 状态码"""
+    message = str(error)
+    if "已存在" in message:
+        return status.HTTP_409_CONFLICT
+    if "不存在" in message:
+        return status.HTTP_404_NOT_FOUND
+    return status.HTTP_400_BAD_REQUEST
+
+
+@router.post("/batch", response_model=BatchResponse)
+async def batch_rules(
+    batch: BatchRequest,
+    config_manager: ConfigManager = Depends(get_config_manager),
+    nginx_manager: NginxManager = Depends(get_nginx_manager)
+):
+    """批量执行规则的创建、更新和删除"""
+    responses = [None] * len(batch.requests)
+    operations = []
+    operation_indexes = []
+
+    # 先校验全部子请求，无效的请求直接返回错误，不参与写入
+    for idx, item in enumerate(batch.requests):
+        try:
+            operations.append(_parse_operation(item.method.upper(), item.url, item.body))
+            operation_indexes.append(idx)
+        except ValidationError as e:
+            responses[idx] = BatchResponseItem(
+                id=item.id,
+                status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                body={"detail": e.errors(include_url=False, include_context=False)}
+            )
+        except ValueError as e:
+            responses[idx] = BatchResponseItem(
+                id=item.id,
+                status=status.HTTP_400_BAD_REQUEST,
+                body={"detail": str(e)}
+            )
+
+    # 整批修改只读取、备份和写入一次配置
+    applied = 0
+    if operations:
+        async with config_manager._write_lock:
+            results = await asyncio.to_thread(config_manager.apply_batch, operations)
+
+        for idx, (op, *args), result in zip(operation_indexes, operations, results):
+            item_id = batch.requests[idx].id
+            if isinstance(result, Exception):
+                responses[idx] = BatchResponseItem(
+                    id=item_id,
+                    status=_error_status(result),
+                    body={"detail": str(result)}
+                )
+                continue
+
+            applied += 1
+            if op == "add":
+                responses[idx] = BatchResponseItem(id=item_id, status=status.HTTP_201_CREATED, body=result)
+            elif op == "update":
+                responses[idx] = BatchResponseItem(id=item_id, status=status.HTTP_200_OK, body=result)
+            else:
+                responses[idx] = BatchResponseItem(
+                    id=item_id,
+                    status=status.HTTP_200_OK,
+                    body={"success": True, "message": f"规则 {args[0]} 已删除"}
+                )
+
+    # 有修改成功时只重载一次 Nginx
+    if applied:
+        logger.info(f"批量操作完成 {applied} 项修改，开始重载 Nginx 配置...")
+        reload_result = await nginx_manager.update_and_reload_async()
+        if not reload_result.success:
+            # 如果重载失败，记录警告但不影响规则修改
+            logger.warning(f"Nginx 重载失败: {reload_result.error}")
+        else:
+            logger.info("Nginx 配置重载成功")
+
+    return BatchResponse(responses=responses)
@@ -1,9 +1,12 @@
 """
 API 路由定义
 """
+import asyncio
+import hashlib
+import json
 import logging
 from typing import List
-from fastapi import APIRouter, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
 from app.models import (
     ProxyRule,
     ProxyRuleCreate,
@@ -14,7 +17,7 @@ from app.models import (
 )
 from app.config_manager import ConfigManager
 from app.nginx_manager import NginxManager
-from app.health_check import health_checker
+from app.health_check import HealthChecker
 
 # 配置日志
 logger = logging.getLogger(__name__)
@@ -22,16 +25,28 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api", tags=["proxy"])
 
-# 初始化管理器
-config_manager = ConfigManager()
-nginx_manager = NginxManager()
+
+# 管理器在应用 lifespan 中创建并挂载到 app.state，通过依赖注入获取
+def get_config_manager(request: Request) -> ConfigManager:
+    """获取配置管理器"""
+    return request.app.state.config_manager
+
+
+def get_nginx_manager(request: Request) -> NginxManager:
+    """获取 Nginx 管理器"""
+    return request.app.state.nginx_manager
+
+
+def get_health_checker(request: Request) -> HealthChecker:
+    """获取健康检查器"""
+    return request.app.state.health_checker
 
 
 @router.get("/rules", response_model=List[ProxyRule])
-async def get_all_rules():
+async def get_all_rules(config_manager: ConfigManager = Depends(get_config_manager)):
     """获取所有代理规则"""
     try:
-        rules = config_manager.get_all_rules()
+        rules = await asyncio.to_thread(config_manager.get_all_rules)
         return rules
     except Exception as e:
         raise HTTPException(
@@ -41,9 +56,9 @@ async def get_all_rules():
 
 
 @router.get("/rules/{rule_id}", response_model=ProxyRule)
-async def get_rule(rule_id: str):
+async def get_rule(rule_id: str, config_manager: ConfigManager = Depends(get_config_manager)):
     """获取指定ID的代理规则"""
-    rule = config_manager.get_rule_by_id(rule_id)
+    rule = await asyncio.to_thread(config_manager.get_rule_by_id, rule_id)
     if not rule:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -53,24 +68,29 @@ async def get_rule(rule_id: str):
 
 
 @router.post("/rules", response_model=ProxyRule, status_code=status.HTTP_201_CREATED)
-async def create_rule(rule_data: ProxyRuleCreate):
+async def create_rule(
+    rule_data: ProxyRuleCreate,
+    config_manager: ConfigManager = Depends(get_config_manager),
+    nginx_manager: NginxManager = Depends(get_nginx_manager)
+):
     """创建新的代理规则"""
     try:
-        # 检查路径是否已存在
-        existing_rule = config_manager.get_rule_by_path(rule_data.path)
-        if existing_rule:
-            raise HTTPException(
-                status_code=status.HTTP_409_CONFLICT,
-                detail=f"路径 {rule_data.path} 已存在"
-            )
-        
-        # 创建规则
-        rule = ProxyRule(**rule_data.model_dump())
-        created_rule = config_manager.add_rule(rule)
+        async with config_manager._write_lock:
+            # 检查路径是否已存在
+            existing_rule = await asyncio.to_thread(config_manager.get_rule_by_path, rule_data.path)
+            if existing_rule:
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail=f"路径 {rule_data.path} 已存在"
+                )
+            
+            # 创建规则
+            rule = ProxyRule(**rule_data.model_dump())
+            created_rule = await asyncio.to_thread(config_manager.add_rule, rule)
         
         # 自动重载 Nginx 配置
         logger.info(f"规则创建成功，开始重载 Nginx 配置...")
-        reload_result = nginx_manager.update_and_reload()
+        reload_result = await nginx_manager.update_and_reload_async()
         if not reload_result.success:
             # 如果重载失败，记录警告但不影响规则创建
             logger.warning(f"Nginx 重载失败: {reload_result.error}")
@@ -91,24 +111,30 @@ async def create_rule(rule_data: ProxyRuleCreate):
 
 
 @router.put("/rules/{rule_id}", response_model=ProxyRule)
-async def update_rule(rule_id: str, rule_data: ProxyRuleUpdate):
+async def update_rule(
+    rule_id: str,
+    rule_data: ProxyRuleUpdate,
+    config_manager: ConfigManager = Depends(get_config_manager),
+    nginx_manager: NginxManager = Depends(get_nginx_manager)
+):
     """更新代理规则"""
     try:
-        # 检查规则是否存在
-        existing_rule = config_manager.get_rule_by_id(rule_id)
-        if not existing_rule:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail=f"规则 {rule_id} 不存在"
-            )
-        
-        # 更新规则
-        updates = rule_data.model_dump(exclude_none=True)
-        updated_rule = config_manager.update_rule(rule_id, updates)
+        async with config_manager._write_lock:
+            # 检查规则是否存在
+            existing_rule = await asyncio.to_thread(config_manager.get_rule_by_id, rule_id)
+            if not existing_rule:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail=f"规则 {rule_id} 不存在"
+                )
+            
+            # 更新规则
+            updates = rule_data.model_dump(exclude_none=True)
+            updated_rule = await asyncio.to_thread(config_manager.update_rule, rule_id, updates)
         
         # 自动重载 Nginx 配置
         logger.info(f"规则更新成功，开始重载 Nginx 配置...")
-        reload_result = nginx_manager.update_and_reload()
+        reload_result = await nginx_manager.update_and_reload_async()
         if not reload_result.success:
             # 如果重载失败，记录警告但不影响规则更新
             logger.warning(f"Nginx 重载失败: {reload_result.error}")
@@ -129,14 +155,19 @@ async def update_rule(rule_id: str, rule_data: ProxyRuleUpdate):
 
 
 @router.delete("/rules/{rule_id}", response_model=APIResponse)
-async def delete_rule(rule_id: str):
+async def delete_rule(
+    rule_id: str,
+    config_manager: ConfigManager = Depends(get_config_manager),
+    nginx_manager: NginxManager = Depends(get_nginx_manager)
+):
     """删除代理规则"""
     try:
-        config_manager.delete_rule(rule_id)
+        async with config_manager._write_lock:
+            await asyncio.to_thread(config_manager.delete_rule, rule_id)
         
         # 自动重载 Nginx 配置
         logger.info(f"规则删除成功，开始重载 Nginx 配置...")
-        reload_result = nginx_manager.update_and_reload()
+        reload_result = await nginx_manager.update_and_reload_async()
         if not reload_result.success:
             # 如果重载失败，记录警告但不影响规则删除
             logger.warning(f"Nginx 重载失败: {reload_result.error}")
@@ -160,10 +191,10 @@ async def delete_rule(rule_id: str):
 
 
 @router.post("/reload", response_model=NginxReloadResponse)
-async def reload_nginx():
+async def reload_nginx(nginx_manager: NginxManager = Depends(get_nginx_manager)):
     """重载 Nginx 配置"""
     try:
-        result = nginx_manager.update_and_reload()
+        result = await nginx_manager.update_and_reload_async()
         
         if not result.success:
             raise HTTPException(
@@ -182,7 +213,7 @@ async def reload_nginx():
 
 
 @router.get("/health", response_model=dict)
-async def get_health_status(rule_id: str = None):
+async def get_health_status(rule_id: str = None, health_checker: HealthChecker = Depends(get_health_checker)):
     """获取健康检查状态"""
     try:
         if rule_id:
@@ -194,7 +225,8 @@ async def get_health_status(rule_id: str = None):
                 )
             return status_data
         else:
-            return health_checker.get_health_status()
+            # 直接返回预先序列化的结果，避免每次请求重复序列化所有规则
+            return Response(content=health_checker.get_health_status_json(), media_type="application/json")
     except HTTPException:
         raise
     except Exception as e:
@@ -205,7 +237,7 @@ async def get_health_status(rule_id: str = None):
 
 
 @router.get("/health/statistics", response_model=dict)
-async def get_health_statistics():
+async def get_health_statistics(health_checker: HealthChecker = Depends(get_health_checker)):
     """获取健康检查统计信息"""
     try:
         return health_checker.get_statistics()
@@ -217,7 +249,7 @@ async def get_health_statistics():
 
 
 @router.post("/health/check", response_model=List[HealthCheckResult])
-async def trigger_health_check():
+async def trigger_health_check(health_checker: HealthChecker = Depends(get_health_checker)):
     """手动触发健康检查"""
     try:
         results = await health_checker.check_all_rules()
@@ -229,17 +261,49 @@ async def trigger_health_check():
         )
 
 
+def _monitor_etag(content: dict) -> str:
+    """
+    计算监控状态的弱 ETag。
+
+    只覆盖服务列表与各服务的健康状态、错误信息，不包含每次检查都会变化的响应时间和检查时间，
+    状态没有变化时 ETag 保持不变，监控脚本可以通过 If-None-Match 得到 304。
+    """
+    key = [
+        content["overall_status"], content["total"], content["healthy"], content["unhealthy"],
+        [
+            (s["path"], s["target"], s["enabled"], s["description"], s["status"], s["error"])
+            for s in content["services"]
+        ],
+    ]
+    digest = hashlib.blake2b(json.dumps(key, ensure_ascii=False).encode("utf-8"), digest_size=8).hexdigest()
+    return f'W/"{digest}"'
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    """按弱比较规则判断 If-None-Match 是否命中"""
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == opaque for tag in if_none_match.split(","))
+
+
 @router.get("/monitor/status")
-async def get_monitor_status():
+async def get_monitor_status(
+    request: Request,
+    response: Response,
+    config_manager: ConfigManager = Depends(get_config_manager),
+    health_checker: HealthChecker = Depends(get_health_checker)
+):
     """
     公开的监控端点（无需 Token），返回所有代理服务的健康状态摘要。
     适用于 ntfy、Uptime Kuma 等外部监控工具调用。
+    支持 ETag / If-None-Match，服务状态没有变化时返回 304。
     """
     try:
         # 先触发一次健康检查获取最新状态
         await health_checker.check_all_rules()
 
-        rules = config_manager.get_all_rules()
+        rules = await asyncio.to_thread(config_manager.get_all_rules)
         statistics = health_checker.get_statistics()
         all_status = health_checker.get_health_status()
 
@@ -260,7 +324,7 @@ async def get_monitor_status():
         unhealthy_services = [s for s in services if s["status"] == "unhealthy"]
         overall_status = "healthy" if not unhealthy_services else "degraded"
 
-        return {
+        content = {
             "overall_status": overall_status,
             "total": statistics.get("total", 0),
             "healthy": statistics.get("healthy", 0),
@@ -270,6 +334,14 @@ async def get_monitor_status():
             "services": services,
             "unhealthy_services": unhealthy_services,
         }
+
+        etag = _monitor_etag(content)
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match and _etag_matches(if_none_match, etag):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+        response.headers["ETag"] = etag
+        return content
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -277,10 +349,10 @@ async def get_monitor_status():
         )
 
 @router.get("/nginx/status", response_model=dict)
-async def get_nginx_status():
+async def get_nginx_status(nginx_manager: NginxManager = Depends(get_nginx_manager)):
     """获取 Nginx 状态信息"""
     try:
-        return nginx_manager.get_nginx_status()
+        return await nginx_manager.get_nginx_status_async()
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -289,10 +361,10 @@ async def get_nginx_status():
 
 
 @router.get("/config/validate", response_model=APIResponse)
-async def validate_config():
+async def validate_config(config_manager: ConfigManager = Depends(get_config_manager)):
     """验证配置文件"""
     try:
-        is_valid, error = config_manager.validate_config()
+        is_valid, error = await asyncio.to_thread(config_manager.validate_config)
         
         if is_valid:
             return APIResponse(
@@ -313,10 +385,10 @@ async def validate_config():
 
 
 @router.get("/config/backups", response_model=List[dict])
-async def list_backups():
+async def list_backups(config_manager: ConfigManager = Depends(get_config_manager)):
     """列出所有配置备份"""
     try:
-        return config_manager.list_backups()
+        return await asyncio.to_thread(config_manager.list_backups)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -325,10 +397,11 @@ async def list_backups():
 
 
 @router.post("/config/restore/{backup_filename}", response_model=APIResponse)
-async def restore_backup(backup_filename: str):
+async def restore_backup(backup_filename: str, config_manager: ConfigManager = Depends(get_config_manager)):
     """从备份恢复配置"""
     try:
-        config_manager.restore_from_backup(backup_filename)
+        async with config_manager._write_lock:
+            await asyncio.to_thread(config_manager.restore_from_backup, backup_filename)
         return APIResponse(
             success=True,
             message=f"已从备份 {backup_filename} 恢复配置"
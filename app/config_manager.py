@@ -3,13 +3,36 @@
 负责读取、写入和管理 YAML 配置文件
 """
 import os
+import copy
+import heapq
+import asyncio
+import threading
 import yaml
 import shutil
-from typing import List, Optional
+from typing import Callable, List, Optional, TypeVar, Union
 from datetime import datetime
 from pathlib import Path
+from pydantic import TypeAdapter
 from app.models import ProxyRule
 
+# 优先使用 libyaml 提供的 C 实现，不可用时回退到纯 Python 实现
+try:
+    from yaml import CSafeLoader as SafeLoader, CSafeDumper as SafeDumper
+except ImportError:
+    from yaml import SafeLoader, SafeDumper
+
+T = TypeVar("T")
+
+# 规则列表校验器只构建一次，整个列表在一次调用中完成校验
+_RULES_ADAPTER = TypeAdapter(List[ProxyRule])
+
+# 备份文件命名与保留策略
+BACKUP_PREFIX = "proxy_config_"
+ROLLING_BACKUP_NAME = "proxy_config_previous.yaml"  # 每次修改前的上一个版本
+SNAPSHOT_TIME_FORMAT = "%Y%m%d_%H%M%S"
+SNAPSHOT_INTERVAL = 3600  # 定时快照的最小间隔（秒）
+MAX_SNAPSHOTS = 10
+
 
 class ConfigManager:
     """配置文件管理器"""
@@ -25,6 +48,19 @@ class ConfigManager:
         
         self.config_path = Path(config_path)
         self.backup_dir = self.config_path.parent / "backups"
+        
+        # 解析结果缓存，以配置文件的 st_mtime_ns 作为失效依据
+        # 读取操作可能在线程池中并发执行，缓存的读写通过 _cache_lock 保护
+        self._cache_lock = threading.RLock()
+        self._cache = None
+        self._cache_mtime = None
+        self._cache_rules = None
+        self._enabled_rules = []
+        self._by_id = {}
+        self._by_path = {}
+        
+        # 串行化配置修改，避免并发请求的读-改-写互相覆盖
+        self._write_lock = asyncio.Lock()
         self._ensure_config_exists()
         self._ensure_backup_dir()
     
@@ -42,160 +78,286 @@ class ConfigManager:
         """确保备份目录存在"""
         self.backup_dir.mkdir(parents=True, exist_ok=True)
     
+    def _invalidate_cache(self):
+        """使解析缓存失效"""
+        with self._cache_lock:
+            self._cache = None
+            self._cache_mtime = None
+            self._cache_rules = None
+            self._enabled_rules = []
+            self._by_id = {}
+            self._by_path = {}
+    
     def _read_yaml(self) -> dict:
-        """读取 YAML 配置文件"""
+        """读取 YAML 配置文件（文件未修改时直接返回缓存，调用方不应修改返回值）"""
         try:
-            with open(self.config_path, 'r', encoding='utf-8') as f:
-                config = yaml.safe_load(f)
-                return config if config else {"rules": []}
+            with self._cache_lock:
+                mtime = self.config_path.stat().st_mtime_ns
+                if self._cache is not None and mtime == self._cache_mtime:
+                    return self._cache
+                
+                with open(self.config_path, 'r', encoding='utf-8') as f:
+                    config = yaml.load(f, Loader=SafeLoader)
+                
+                self._cache = config if config else {"rules": []}
+                self._cache_mtime = mtime
+                self._cache_rules = None
+                return self._cache
         except Exception as e:
             raise Exception(f"读取配置文件失败: {str(e)}")
     
-    def _write_yaml(self, config: dict):
-        """写入 YAML 配置文件"""
+    def _read_yaml_for_update(self) -> dict:
+        """读取配置文件的可修改副本，供增删改操作使用"""
+        return copy.deepcopy(self._read_yaml())
+    
+    def _write_yaml(self, config: dict, backup: bool = False):
+        """写入 YAML 配置文件（先写临时文件再原子替换，backup 为 True 时在替换前备份当前配置）"""
+        tmp_path = self.config_path.with_name(self.config_path.name + '.tmp')
         try:
-            with open(self.config_path, 'w', encoding='utf-8') as f:
-                yaml.safe_dump(config, f, allow_unicode=True, default_flow_style=False, sort_keys=False)
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                yaml.dump(config, f, Dumper=SafeDumper, allow_unicode=True, default_flow_style=False, sort_keys=False)
+            self._replace_config(tmp_path, backup)
         except Exception as e:
             raise Exception(f"写入配置文件失败: {str(e)}")
     
+    def _replace_config(self, new_path: Path, backup: bool):
+        """用 new_path 原子替换当前配置文件"""
+        if backup:
+            self._backup_config()
+        os.replace(new_path, self.config_path)
+        self._invalidate_cache()
+    
+    @staticmethod
+    def _link_or_copy(src: Path, dst: Path):
+        """以硬链接方式保存文件，文件系统不支持时回退为复制"""
+        dst.unlink(missing_ok=True)
+        try:
+            os.link(src, dst)
+        except OSError:
+            shutil.copy2(src, dst)
+    
+    def _list_snapshot_names(self) -> List[str]:
+        """返回定时快照文件名，不保证顺序"""
+        with os.scandir(self.backup_dir) as it:
+            return [
+                entry.name for entry in it
+                if entry.name.startswith(BACKUP_PREFIX) and entry.name.endswith(".yaml")
+                and entry.name != ROLLING_BACKUP_NAME
+            ]
+    
     def _backup_config(self):
-        """备份当前配置文件"""
-        if self.config_path.exists():
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            backup_path = self.backup_dir / f"proxy_config_{timestamp}.yaml"
-            shutil.copy2(self.config_path, backup_path)
+        """
+        备份当前配置文件
+        
+        必须在新配置替换当前文件之前调用：当前文件以硬链接保存为滚动备份，
+        替换后旧内容只保留在备份中，无需复制整个文件。
+        距离最近一次定时快照超过 SNAPSHOT_INTERVAL 时额外保存一份带时间戳的快照。
+        """
+        if not self.config_path.exists():
+            return
+        
+        self._link_or_copy(self.config_path, self.backup_dir / ROLLING_BACKUP_NAME)
+        
+        now = datetime.now()
+        snapshots = self._list_snapshot_names()
+        if snapshots:
+            try:
+                # 时间戳格式保证文件名的字典序即时间顺序
+                last_time = datetime.strptime(
+                    max(snapshots)[len(BACKUP_PREFIX):-len(".yaml")], SNAPSHOT_TIME_FORMAT
+                )
+                if (now - last_time).total_seconds() < SNAPSHOT_INTERVAL:
+                    return
+            except ValueError:
+                pass
+        
+        backup_path = self.backup_dir / f"{BACKUP_PREFIX}{now.strftime(SNAPSHOT_TIME_FORMAT)}.yaml"
+        self._link_or_copy(self.config_path, backup_path)
+        
+        # 只保留最近10个快照
+        snapshots = self._list_snapshot_names()
+        if len(snapshots) > MAX_SNAPSHOTS:
+            for name in heapq.nsmallest(len(snapshots) - MAX_SNAPSHOTS, snapshots):
+                (self.backup_dir / name).unlink()
+    
+    def _load_rules(self) -> List[ProxyRule]:
+        """加载规则列表并刷新 ID / 路径索引及启用规则列表（命中缓存时直接返回）"""
+        with self._cache_lock:
+            config = self._read_yaml()
+            if self._cache_rules is not None:
+                return self._cache_rules
+            
+            # 缺少 ID 的规则使用其序号作为 ID，不修改缓存中的原始数据
+            rules_data = [
+                rule_data if "id" in rule_data else {**rule_data, "id": str(idx)}
+                for idx, rule_data in enumerate(config.get("rules", []))
+            ]
+            rules = _RULES_ADAPTER.validate_python(rules_data)
             
-            # 只保留最近10个备份
-            backups = sorted(self.backup_dir.glob("proxy_config_*.yaml"))
-            if len(backups) > 10:
-                for old_backup in backups[:-10]:
-                    old_backup.unlink()
+            self._cache_rules = rules
+            self._enabled_rules = [rule for rule in rules if rule.enabled]
+            self._by_id = {rule.id: rule for rule in rules}
+            self._by_path = {rule.path: rule for rule in rules}
+            return rules
     
     def get_all_rules(self) -> List[ProxyRule]:
         """获取所有代理规则"""
-        config = self._read_yaml()
-        rules = []
-        
-        for idx, rule_data in enumerate(config.get("rules", [])):
-            rule_data["id"] = rule_data.get("id", str(idx))
-            rules.append(ProxyRule(**rule_data))
-        
-        return rules
+        return list(self._load_rules())
     
     def get_rule_by_id(self, rule_id: str) -> Optional[ProxyRule]:
         """根据ID获取代理规则"""
-        rules = self.get_all_rules()
-        for rule in rules:
-            if rule.id == rule_id:
-                return rule
-        return None
+        with self._cache_lock:
+            self._load_rules()
+            return self._by_id.get(rule_id)
     
     def get_rule_by_path(self, path: str) -> Optional[ProxyRule]:
         """根据路径获取代理规则"""
-        rules = self.get_all_rules()
-        for rule in rules:
-            if rule.path == path:
-                return rule
-        return None
+        with self._cache_lock:
+            self._load_rules()
+            return self._by_path.get(path)
     
-    def add_rule(self, rule: ProxyRule) -> ProxyRule:
-        """添加新的代理规则"""
-        # 备份当前配置
-        self._backup_config()
+    def _load_then_mutate(self, mutate: Callable[[list, dict], T]) -> T:
+        """读取一次配置，交由 mutate 修改规则列表，校验通过后备份并写回"""
+        result = self._apply_mutations([mutate])[0]
+        if isinstance(result, Exception):
+            raise result
+        return result
+    
+    def _apply_mutations(self, mutations: List[Callable[[list, dict], T]]) -> List[Union[T, Exception]]:
+        """
+        在同一份配置上依次执行多个修改，只读取、备份和写入一次
         
-        # 读取当前配置
-        config = self._read_yaml()
+        Args:
+            mutations: 修改函数列表，参数为规则列表和路径到规则ID的索引
+            
+        Returns:
+            与 mutations 一一对应的结果；执行失败的修改返回其 ValueError，不影响其他修改
+        """
+        with self._cache_lock:
+            config = self._read_yaml_for_update()
+            self._load_rules()
+            paths = {path: rule.id for path, rule in self._by_path.items()}
         rules = config.get("rules", [])
         
-        # 检查路径是否已存在
-        for existing_rule in rules:
-            if existing_rule.get("path") == rule.path:
-                raise ValueError(f"路径 {rule.path} 已存在")
-        
-        # 生成新ID
-        if rule.id is None:
-            existing_ids = [int(r.get("id", 0)) for r in rules if r.get("id", "").isdigit()]
-            rule.id = str(max(existing_ids, default=0) + 1)
-        
-        # 设置时间戳
-        now = datetime.now()
-        rule.created_at = now
-        rule.updated_at = now
+        results = []
+        for mutate in mutations:
+            try:
+                results.append(mutate(rules, paths))
+            except ValueError as e:
+                results.append(e)
         
-        # 添加规则
-        rule_dict = rule.model_dump(exclude_none=True)
-        rule_dict["created_at"] = rule.created_at.isoformat()
-        rule_dict["updated_at"] = rule.updated_at.isoformat()
-        rules.append(rule_dict)
+        # 全部修改失败时不会产生备份，也不会写入文件
+        if all(isinstance(result, Exception) for result in results):
+            return results
         
-        # 保存配置
+        # 保存配置（替换前自动备份当前配置）
         config["rules"] = rules
-        self._write_yaml(config)
+        self._write_yaml(config, backup=True)
         
-        return rule
+        return results
     
-    def update_rule(self, rule_id: str, updates: dict) -> ProxyRule:
-        """更新代理规则"""
-        # 备份当前配置
-        self._backup_config()
-        
-        # 读取当前配置
-        config = self._read_yaml()
-        rules = config.get("rules", [])
+    def _add_rule_mutation(self, rule: ProxyRule) -> Callable[[list, dict], ProxyRule]:
+        """构造添加规则的修改函数"""
+        def mutate(rules: list, paths: dict) -> ProxyRule:
+            # 检查路径是否已存在
+            if rule.path in paths:
+                raise ValueError(f"路径 {rule.path} 已存在")
+            
+            # 生成新ID
+            if rule.id is None:
+                existing_ids = [int(r.get("id", 0)) for r in rules if r.get("id", "").isdigit()]
+                rule.id = str(max(existing_ids, default=0) + 1)
+            
+            # 设置时间戳
+            now = datetime.now()
+            rule.created_at = now
+            rule.updated_at = now
+            
+            # 添加规则
+            rule_dict = rule.model_dump(exclude_none=True)
+            rule_dict["created_at"] = rule.created_at.isoformat()
+            rule_dict["updated_at"] = rule.updated_at.isoformat()
+            rules.append(rule_dict)
+            paths[rule.path] = rule.id
+            return rule
         
-        # 查找并更新规则
-        rule_found = False
-        for idx, rule in enumerate(rules):
-            if rule.get("id") == rule_id:
-                # 如果更新路径，检查新路径是否已存在
-                if "path" in updates and updates["path"] != rule.get("path"):
-                    for other_rule in rules:
-                        if other_rule.get("id") != rule_id and other_rule.get("path") == updates["path"]:
+        return mutate
+    
+    def _update_rule_mutation(self, rule_id: str, updates: dict) -> Callable[[list, dict], ProxyRule]:
+        """构造更新规则的修改函数"""
+        def mutate(rules: list, paths: dict) -> ProxyRule:
+            # 查找并更新规则
+            for idx, rule in enumerate(rules):
+                if rule.get("id") == rule_id:
+                    # 如果更新路径，检查新路径是否已存在
+                    path_changed = "path" in updates and updates["path"] != rule.get("path")
+                    if path_changed:
+                        other_id = paths.get(updates["path"])
+                        if other_id is not None and other_id != rule_id:
                             raise ValueError(f"路径 {updates['path']} 已存在")
-                
-                # 更新字段
-                for key, value in updates.items():
-                    if value is not None:
-                        rule[key] = value
-                
-                # 更新时间戳
-                rule["updated_at"] = datetime.now().isoformat()
-                rules[idx] = rule
-                rule_found = True
-                break
-        
-        if not rule_found:
+                    
+                    # 在副本上合并更新字段并更新时间戳，校验通过后才写回，
+                    # 校验失败时不会在批量操作共享的配置中留下无效的值
+                    merged = {**rule, **{key: value for key, value in updates.items() if value is not None}}
+                    merged["updated_at"] = datetime.now().isoformat()
+                    updated_rule = ProxyRule(**merged)
+                    
+                    rules[idx] = merged
+                    if path_changed:
+                        paths.pop(rule.get("path"), None)
+                        paths[updates["path"]] = rule_id
+                    
+                    # 返回更新后的规则
+                    return updated_rule
+            
             raise ValueError(f"规则 ID {rule_id} 不存在")
         
-        # 保存配置
-        config["rules"] = rules
-        self._write_yaml(config)
+        return mutate
+    
+    def _delete_rule_mutation(self, rule_id: str) -> Callable[[list, dict], bool]:
+        """构造删除规则的修改函数"""
+        def mutate(rules: list, paths: dict) -> bool:
+            # 删除所有匹配 ID 的规则
+            removed = [rule for rule in rules if rule.get("id") == rule_id]
+            if not removed:
+                raise ValueError(f"规则 ID {rule_id} 不存在")
+            
+            rules[:] = [rule for rule in rules if rule.get("id") != rule_id]
+            for rule in removed:
+                if paths.get(rule.get("path")) == rule_id:
+                    del paths[rule.get("path")]
+            return True
         
-        # 返回更新后的规则
-        return ProxyRule(**rules[idx])
+        return mutate
+    
+    def add_rule(self, rule: ProxyRule) -> ProxyRule:
+        """添加新的代理规则"""
+        return self._load_then_mutate(self._add_rule_mutation(rule))
+    
+    def update_rule(self, rule_id: str, updates: dict) -> ProxyRule:
+        """更新代理规则"""
+        return self._load_then_mutate(self._update_rule_mutation(rule_id, updates))
     
     def delete_rule(self, rule_id: str) -> bool:
         """删除代理规则"""
-        # 备份当前配置
-        self._backup_config()
-        
-        # 读取当前配置
-        config = self._read_yaml()
-        rules = config.get("rules", [])
-        
-        # 查找并删除规则
-        initial_count = len(rules)
-        rules = [rule for rule in rules if rule.get("id") != rule_id]
-        
-        if len(rules) == initial_count:
-            raise ValueError(f"规则 ID {rule_id} 不存在")
-        
-        # 保存配置
-        config["rules"] = rules
-        self._write_yaml(config)
+        return self._load_then_mutate(self._delete_rule_mutation(rule_id))
+    
+    def apply_batch(self, operations: List[tuple]) -> List[Union[ProxyRule, bool, Exception]]:
+        """
+        批量执行规则修改，整批只读取、备份和写入一次配置
         
-        return True
+        Args:
+            operations: 操作列表，每项为 ("add", rule)、("update", rule_id, updates) 或 ("delete", rule_id)
+            
+        Returns:
+            与 operations 一一对应的结果；失败的操作返回对应的 ValueError
+        """
+        builders = {
+            "add": self._add_rule_mutation,
+            "update": self._update_rule_mutation,
+            "delete": self._delete_rule_mutation,
+        }
+        return self._apply_mutations([builders[op](*args) for op, *args in operations])
     
     def validate_config(self) -> tuple[bool, Optional[str]]:
         """验证配置文件的有效性"""
@@ -211,19 +373,26 @@ class ConfigManager:
             if not isinstance(config["rules"], list):
                 return False, "rules 字段必须是列表"
             
-            # 验证每个规则
+            # 验证每个规则：先做廉价的字典检查，通过后再构造模型，遇到错误立即返回
             paths = set()
             for idx, rule in enumerate(config["rules"]):
-                try:
-                    ProxyRule(**rule)
-                except Exception as e:
-                    return False, f"规则 {idx} 验证失败: {str(e)}"
+                if not isinstance(rule, dict):
+                    return False, f"规则 {idx} 验证失败: 规则必须是字典"
                 
                 # 检查路径重复
                 path = rule.get("path")
                 if path in paths:
                     return False, f"路径 {path} 重复"
                 paths.add(path)
+                
+                # 当前解析结果已成功构造过规则列表时，无需再次校验模型
+                if self._cache_rules is not None and config is self._cache:
+                    continue
+                
+                try:
+                    ProxyRule.model_validate(rule)
+                except Exception as e:
+                    return False, f"规则 {idx} 验证失败: {str(e)}"
             
             return True, None
             
@@ -231,9 +400,10 @@ class ConfigManager:
             return False, f"配置验证失败: {str(e)}"
     
     def get_enabled_rules(self) -> List[ProxyRule]:
-        """获取所有启用的代理规则"""
-        all_rules = self.get_all_rules()
-        return [rule for rule in all_rules if rule.enabled]
+        """获取所有启用的代理规则（随解析缓存一起失效，配置未修改时不重复过滤）"""
+        with self._cache_lock:
+            self._load_rules()
+            return list(self._enabled_rules)
     
     def restore_from_backup(self, backup_filename: str) -> bool:
         """从备份恢复配置"""
@@ -242,11 +412,12 @@ class ConfigManager:
         if not backup_path.exists():
             raise FileNotFoundError(f"备份文件 {backup_filename} 不存在")
         
-        # 备份当前配置
-        self._backup_config()
+        # 先复制到临时文件，避免备份当前配置时覆盖待恢复的滚动备份
+        tmp_path = self.config_path.with_name(self.config_path.name + '.tmp')
+        shutil.copy2(backup_path, tmp_path)
         
-        # 恢复备份
-        shutil.copy2(backup_path, self.config_path)
+        # 备份当前配置并恢复
+        self._replace_config(tmp_path, backup=True)
         
         # 验证恢复后的配置
         is_valid, error = self.validate_config()
@@ -257,11 +428,19 @@ class ConfigManager:
     
     def list_backups(self) -> List[dict]:
         """列出所有备份文件"""
+        with os.scandir(self.backup_dir) as it:
+            entries = [
+                entry for entry in it
+                if entry.name.startswith(BACKUP_PREFIX) and entry.name.endswith(".yaml")
+            ]
+        entries.sort(key=lambda entry: entry.name, reverse=True)
+        
         backups = []
-        for backup_file in sorted(self.backup_dir.glob("proxy_config_*.yaml"), reverse=True):
+        for entry in entries:
+            st = entry.stat()
             backups.append({
-                "filename": backup_file.name,
-                "created_at": datetime.fromtimestamp(backup_file.stat().st_mtime).isoformat(),
-                "size": backup_file.stat().st_size
+                "filename": entry.name,
+                "created_at": datetime.fromtimestamp(st.st_mtime).isoformat(),
+                "size": st.st_size
             })
         return backups
@@ -4,29 +4,195 @@
 使用 TCP 端口检查替代 HTTP 检查
 """
 import asyncio
-from typing import Dict, List
+import json
+import logging
+import socket
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
 from datetime import datetime
 from app.models import ProxyRule, HealthCheckResult
 from app.config_manager import ConfigManager
 
+# 配置日志
+logger = logging.getLogger(__name__)
+
+# 目标地址解析结果的缓存时间（秒）
+ADDR_CACHE_TTL = 300
+
+# 保留的空闲连接的内核保活参数（秒 / 次）
+KEEPALIVE_IDLE = 60
+KEEPALIVE_INTERVAL = 10
+KEEPALIVE_COUNT = 3
+
+# 保留的连接最多复用的时间（秒），超过后重新建立连接，
+# 确保目标仍能接受新连接并重新测量响应时间
+POOL_REUSE_TTL = 60
+
+# 检查保留连接时读空接收缓冲区的单次读取大小和最多读取次数
+DRAIN_CHUNK_SIZE = 4096
+DRAIN_MAX_READS = 16
+
 
 class HealthChecker:
     """健康检查器"""
     
-    def __init__(self, timeout: int = 5, check_interval: int = 30):
+    def __init__(
+        self,
+        config_manager: Optional[ConfigManager] = None,
+        timeout: int = 5,
+        check_interval: int = 30,
+        max_entries: int = 4096,
+        max_concurrency: int = 128,
+        max_pooled_connections: int = 256
+    ):
         """
         初始化健康检查器
         
         Args:
+            config_manager: 配置管理器，为 None 时自动创建
             timeout: TCP 连接超时时间（秒）
             check_interval: 检查间隔时间（秒）
+            max_entries: 健康状态缓存的最大条目数
+            max_concurrency: 同时进行的 TCP 连接检查数上限
+            max_pooled_connections: 保留的空闲连接数上限
         """
         self.timeout = timeout
         self.check_interval = check_interval
-        self.config_manager = ConfigManager()
-        self.health_status: Dict[str, HealthCheckResult] = {}
+        self.max_entries = max_entries
+        self.max_pooled_connections = max_pooled_connections
+        self.config_manager = config_manager or ConfigManager()
+        self.health_status: "OrderedDict[str, HealthCheckResult]" = OrderedDict()
         self._running = False
         self._task = None
+        self._sem = asyncio.Semaphore(max_concurrency)
+        
+        # 统计信息的增量计数，随 health_status 的写入/删除同步维护
+        self._counts = {"healthy": 0, "unhealthy": 0}
+        self._rt_sum = 0.0
+        self._rt_count = 0
+        self._last_check_time = None
+        
+        # 每个结果预先序列化的 JSON 片段（"rule_id":{...}），查询全部状态时直接拼接
+        self._json_cache: Dict[str, bytes] = {}
+        
+        # 目标地址解析结果缓存：(host, port) -> (过期时间, getaddrinfo 结果)
+        self._addr_cache: Dict[Tuple[str, int], Tuple[float, list]] = {}
+        
+        # 检查成功后保留的空闲连接：(host, port) -> (套接字, 复用截止时间, 建立连接的耗时)
+        # 截止时间之前连接仍然可用时无需重新握手，沿用建立连接时测得的响应时间
+        self._pool: Dict[Tuple[str, int], Tuple[socket.socket, float, float]] = {}
+    
+    def _account(self, result: HealthCheckResult, sign: int):
+        """将单个结果计入（sign=1）或移出（sign=-1）统计计数"""
+        if result.status in self._counts:
+            self._counts[result.status] += sign
+        if result.response_time_ms is not None:
+            self._rt_sum += sign * result.response_time_ms
+            self._rt_count += sign
+    
+    def _store_result(self, result: HealthCheckResult):
+        """写入健康状态缓存并更新统计计数"""
+        previous = self.health_status.get(result.rule_id)
+        if previous is not None:
+            self._account(previous, -1)
+        self._account(result, 1)
+        
+        self.health_status[result.rule_id] = result
+        self.health_status.move_to_end(result.rule_id)
+        self._json_cache[result.rule_id] = (
+            json.dumps(result.rule_id).encode() + b":" + result.model_dump_json().encode()
+        )
+        
+        if self._last_check_time is None or result.last_check_time > self._last_check_time:
+            self._last_check_time = result.last_check_time
+    
+    def _drop_result(self, rule_id: str):
+        """从健康状态缓存中移除并更新统计计数"""
+        result = self.health_status.pop(rule_id)
+        self._json_cache.pop(rule_id, None)
+        self._account(result, -1)
+        if not self.health_status:
+            self._rt_sum = 0.0
+            self._last_check_time = None
+    
+    async def _resolve(self, host: str, port: int) -> list:
+        """解析目标地址，结果在 ADDR_CACHE_TTL 内复用，避免每次检查都调用 getaddrinfo"""
+        key = (host, port)
+        cached = self._addr_cache.get(key)
+        now = time.monotonic()
+        if cached is not None and cached[0] > now:
+            return cached[1]
+        
+        addrs = await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        self._addr_cache[key] = (now + ADDR_CACHE_TTL, addrs)
+        return addrs
+    
+    async def _connect(self, host: str, port: int) -> socket.socket:
+        """依次尝试解析到的地址建立 TCP 连接，返回已连接的套接字"""
+        loop = asyncio.get_running_loop()
+        last_error = None
+        for family, type_, proto, _, sockaddr in await self._resolve(host, port):
+            sock = socket.socket(family, type_, proto)
+            try:
+                sock.setblocking(False)
+                await loop.sock_connect(sock, sockaddr)
+                return sock
+            except OSError as e:
+                sock.close()
+                last_error = e
+            except BaseException:
+                sock.close()
+                raise
+        
+        # 全部地址连接失败时丢弃解析缓存，下次检查重新解析
+        self._addr_cache.pop((host, port), None)
+        raise last_error or OSError(f"无法解析地址: {host}")
+    
+    @staticmethod
+    def _enable_keepalive(sock: socket.socket):
+        """开启 TCP 保活，由内核探测空闲连接的对端是否存活"""
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        for option, value in (
+            ("TCP_KEEPIDLE", KEEPALIVE_IDLE),
+            ("TCP_KEEPINTVL", KEEPALIVE_INTERVAL),
+            ("TCP_KEEPCNT", KEEPALIVE_COUNT),
+        ):
+            if hasattr(socket, option):
+                sock.setsockopt(socket.IPPROTO_TCP, getattr(socket, option), value)
+    
+    @staticmethod
+    def _is_alive(sock: socket.socket) -> bool:
+        """检查空闲连接是否仍然可用：没有挂起的错误且对端未关闭连接"""
+        try:
+            if sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR):
+                return False
+            # 非阻塞地读空接收缓冲区：服务端主动发送的欢迎信息（SSH、SMTP、MySQL 等）
+            # 会留在缓冲区里，只窥探不读取时永远读不到其后的 EOF
+            for _ in range(DRAIN_MAX_READS):
+                if not sock.recv(DRAIN_CHUNK_SIZE):
+                    return False
+            # 对端仍在持续发送数据，说明连接存活
+            return True
+        except BlockingIOError:
+            return True
+        except OSError:
+            return False
+    
+    def _keep_connection(self, key: Tuple[str, int], sock: socket.socket, response_time: float):
+        """保留检查成功的连接供 POOL_REUSE_TTL 内的检查复用，超出上限时直接关闭"""
+        self._close_connection(key)
+        if len(self._pool) >= self.max_pooled_connections:
+            sock.close()
+            return
+        self._enable_keepalive(sock)
+        self._pool[key] = (sock, time.monotonic() + POOL_REUSE_TTL, response_time)
+    
+    def _close_connection(self, key: Tuple[str, int]):
+        """关闭并移除保留的连接"""
+        pooled = self._pool.pop(key, None)
+        if pooled is not None:
+            pooled[0].close()
     
     async def check_single_rule(self, rule: ProxyRule) -> HealthCheckResult:
         """
@@ -50,20 +216,29 @@ class HealthChecker:
         )
         
         try:
-            start_time = datetime.now()
-            
-            # 使用 asyncio.open_connection 进行 TCP 连接测试
-            reader, writer = await asyncio.wait_for(
-                asyncio.open_connection(rule.target_host, rule.target_port),
-                timeout=self.timeout
-            )
-            
-            end_time = datetime.now()
-            response_time = (end_time - start_time).total_seconds() * 1000
+            loop = asyncio.get_running_loop()
+            key = (rule.target_host, rule.target_port)
             
-            # 关闭连接
-            writer.close()
-            await writer.wait_closed()
+            pooled = self._pool.get(key)
+            if pooled is not None and pooled[1] > time.monotonic() and self._is_alive(pooled[0]):
+                # 保留的连接未过期且仍然可用，沿用建立该连接时测得的响应时间
+                response_time = pooled[2]
+            else:
+                self._close_connection(key)
+                
+                # 使用缓存的解析结果直接建立 TCP 连接进行测试，信号量限制同时打开的连接数
+                async with self._sem:
+                    start_time = loop.time()
+                    
+                    sock = await asyncio.wait_for(
+                        self._connect(rule.target_host, rule.target_port),
+                        timeout=self.timeout
+                    )
+                    
+                    # loop.time() 为单调时钟，不受系统时间调整影响
+                    response_time = (loop.time() - start_time) * 1000
+                
+                self._keep_connection(key, sock, response_time)
             
             result.response_time_ms = round(response_time, 2)
             result.status_code = None  # TCP 检查不返回状态码
@@ -91,7 +266,8 @@ class HealthChecker:
         Returns:
             所有规则的健康检查结果列表
         """
-        rules = self.config_manager.get_enabled_rules()
+        # 读取配置涉及磁盘 I/O 和 YAML 解析，放到线程中执行以免阻塞事件循环
+        rules = await asyncio.to_thread(self.config_manager.get_enabled_rules)
         
         # 并发检查所有规则
         tasks = [self.check_single_rule(rule) for rule in rules]
@@ -100,7 +276,17 @@ class HealthChecker:
         # 更新健康状态缓存
         for result in results:
             if isinstance(result, HealthCheckResult):
-                self.health_status[result.rule_id] = result
+                self._store_result(result)
+        
+        # 清理已删除或已禁用规则的状态和保留的连接，并限制缓存大小
+        current_ids = {rule.id for rule in rules}
+        for rule_id in [rid for rid in self.health_status if rid not in current_ids]:
+            self._drop_result(rule_id)
+        current_targets = {(rule.target_host, rule.target_port) for rule in rules}
+        for key in [key for key in self._pool if key not in current_targets]:
+            self._close_connection(key)
+        while len(self.health_status) > self.max_entries:
+            self._drop_result(next(iter(self.health_status)))
         
         return [r for r in results if isinstance(r, HealthCheckResult)]
     
@@ -109,8 +295,8 @@ class HealthChecker:
         while self._running:
             try:
                 await self.check_all_rules()
-            except Exception as e:
-                print(f"健康检查异常: {e}")
+            except Exception:
+                logger.exception("健康检查异常")
             
             # 等待下一次检查
             await asyncio.sleep(self.check_interval)
@@ -126,6 +312,18 @@ class HealthChecker:
         self._running = False
         if self._task:
             self._task.cancel()
+        for key in list(self._pool):
+            self._close_connection(key)
+    
+    async def stop_async(self):
+        """停止健康检查，并等待正在进行的检查结束后再关闭保留的连接"""
+        self._running = False
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        for key in list(self._pool):
+            self._close_connection(key)
     
     def get_health_status(self, rule_id: str = None) -> Dict:
         """
@@ -149,6 +347,15 @@ class HealthChecker:
                 for rule_id, result in self.health_status.items()
             }
     
+    def get_health_status_json(self) -> bytes:
+        """
+        获取所有规则健康状态的 JSON 编码，结构与 get_health_status() 相同
+        
+        Returns:
+            由缓存的序列化结果拼接而成的 JSON 字节串
+        """
+        return b"{" + b",".join(self._json_cache.values()) + b"}"
+    
     def get_unhealthy_rules(self) -> List[HealthCheckResult]:
         """获取所有不健康的规则"""
         return [
@@ -166,19 +373,14 @@ class HealthChecker:
     def get_statistics(self) -> Dict:
         """获取健康检查统计信息"""
         total = len(self.health_status)
-        healthy = len(self.get_healthy_rules())
-        unhealthy = len(self.get_unhealthy_rules())
+        healthy = self._counts["healthy"]
+        unhealthy = self._counts["unhealthy"]
         unknown = total - healthy - unhealthy
         
         # 计算平均响应时间
-        response_times = [
-            result.response_time_ms
-            for result in self.health_status.values()
-            if result.response_time_ms is not None
-        ]
         avg_response_time = (
-            round(sum(response_times) / len(response_times), 2)
-            if response_times else None
+            round(self._rt_sum / self._rt_count, 2)
+            if self._rt_count else None
         )
         
         return {
@@ -188,12 +390,6 @@ class HealthChecker:
             "unknown": unknown,
             "health_rate": round(healthy / total * 100, 2) if total > 0 else 0,
             "avg_response_time_ms": avg_response_time,
-            "last_check_time": max(
-                (result.last_check_time for result in self.health_status.values()),
-                default=None
-            )
+            "last_check_time": self._last_check_time
         }
 
-
-# 全局健康检查器实例
-health_checker = HealthChecker()
@@ -1,8 +1,8 @@
 """
 数据模型定义
 """
-from typing import Optional
-from pydantic import BaseModel, Field, validator
+from typing import Any, List, Optional
+from pydantic import BaseModel, ConfigDict, Field, field_validator
 from datetime import datetime
 
 
@@ -18,7 +18,8 @@ class ProxyRule(BaseModel):
     created_at: Optional[datetime] = None
     updated_at: Optional[datetime] = None
 
-    @validator('path')
+    @field_validator('path')
+    @classmethod
     def validate_path(cls, v):
         """验证路径格式"""
         if not v.startswith('/'):
@@ -27,8 +28,8 @@ class ProxyRule(BaseModel):
             raise ValueError('路径不能包含空格')
         return v
 
-    class Config:
-        json_schema_extra = {
+    model_config = ConfigDict(
+        json_schema_extra={
             "example": {
                 "path": "/api",
                 "target_port": 8001,
@@ -38,6 +39,7 @@ class ProxyRule(BaseModel):
                 "description": "API 服务"
             }
         }
+    )
 
 
 class ProxyRuleCreate(BaseModel):
@@ -49,7 +51,8 @@ class ProxyRuleCreate(BaseModel):
     preserve_path: bool = Field(default=False, description="是否保留请求路径前缀（如 Jupyter 等需要 base_url 的服务需开启）")
     description: Optional[str] = Field(default="", description="规则描述")
 
-    @validator('path')
+    @field_validator('path')
+    @classmethod
     def validate_path(cls, v):
         if not v.startswith('/'):
             raise ValueError('路径必须以 / 开头')
@@ -67,10 +70,15 @@ class ProxyRuleUpdate(BaseModel):
     preserve_path: Optional[bool] = None
     description: Optional[str] = None
 
-    @validator('path')
+    @field_validator('path')
+    @classmethod
     def validate_path(cls, v):
-        if v is not None and not v.startswith('/'):
+        if v is None:
+            return v
+        if not v.startswith('/'):
             raise ValueError('路径必须以 / 开头')
+        if ' ' in v:
+            raise ValueError('路径不能包含空格')
         return v
 
 
@@ -85,8 +93,8 @@ class HealthCheckResult(BaseModel):
     error_message: Optional[str] = None
     last_check_time: datetime
     
-    class Config:
-        json_schema_extra = {
+    model_config = ConfigDict(
+        json_schema_extra={
             "example": {
                 "rule_id": "1",
                 "path": "/api",
@@ -97,6 +105,7 @@ class HealthCheckResult(BaseModel):
                 "last_check_time": "2026-02-07T11:45:00"
             }
         }
+    )
 
 
 class NginxReloadResponse(BaseModel):
@@ -114,3 +123,39 @@ class APIResponse(BaseModel):
     data: Optional[dict] = None
     error: Optional[str] = None
 
+
+class BatchRequestItem(BaseModel):
+    """批量请求中的单个子请求"""
+    id: str = Field(..., description="子请求标识，原样返回以便对应结果")
+    method: str = Field(..., description="HTTP 方法: POST, PUT, DELETE")
+    url: str = Field(..., description="目标路径，如 /api/rules 或 /api/rules/1")
+    body: Optional[dict] = Field(default=None, description="请求体")
+
+
+class BatchRequest(BaseModel):
+    """批量请求模型"""
+    requests: List[BatchRequestItem]
+
+    model_config = ConfigDict(
+        json_schema_extra={
+            "example": {
+                "requests": [
+                    {"id": "1", "method": "POST", "url": "/api/rules", "body": {"path": "/api", "target_port": 8001}},
+                    {"id": "2", "method": "PUT", "url": "/api/rules/3", "body": {"enabled": False}},
+                    {"id": "3", "method": "DELETE", "url": "/api/rules/4"}
+                ]
+            }
+        }
+    )
+
+
+class BatchResponseItem(BaseModel):
+    """批量请求中单个子请求的结果"""
+    id: str
+    status: int
+    body: Any = None
+
+
+class BatchResponse(BaseModel):
+    """批量响应模型"""
+    responses: List[BatchResponseItem]
@@ -4,20 +4,147 @@ Nginx 配置管理模块
 支持 Docker 环境和本地环境
 """
 import os
+import asyncio
 import subprocess
-import shutil
 import socket
 import json
 import logging
+import atexit
+import select
+import shlex
+import stat
+import http.client
+from collections import Counter
+from datetime import datetime
+import threading
+import time
+from functools import lru_cache
 from pathlib import Path
 from typing import List, Optional
-from jinja2 import Template
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader, Template
 from app.models import ProxyRule, NginxReloadResponse
 from app.config_manager import ConfigManager
 
 # 配置日志
 logger = logging.getLogger(__name__)
 
+# Docker API 的 Unix 套接字及请求超时时间（秒）
+DOCKER_SOCK_PATH = '/var/run/docker.sock'
+DOCKER_API_TIMEOUT = 10
+# 保留的空闲 Docker API 连接数上限（状态查询会同时发出多个请求）
+DOCKER_API_MAX_IDLE = 4
+
+# 容器运行状态的缓存时间（秒），避免状态轮询频繁访问 Docker
+CONTAINER_STATE_TTL = 2
+
+# 模板文件是否存在的缓存时间（秒）
+TEMPLATE_EXISTS_TTL = 60
+
+# 串行化配置写入、测试和重载，避免并发重载互相覆盖配置文件
+_reload_lock = asyncio.Lock()
+
+# 常驻 shell 中每条命令结束时输出的标记，后跟命令的退出码
+SHELL_END_MARKER = b"__END__:"
+
+# Jinja2 字节码缓存目录，模板的编译结果在进程重启后仍可复用；
+# 未设置时使用 Jinja2 的默认目录（按用户区分，并校验属主和 0700 权限）
+JINJA_BC_CACHE_DIR = os.getenv('JINJA_BC_CACHE')
+
+
+def _ensure_private_dir(path: str):
+    """创建仅当前用户可访问的目录；已存在的目录必须属于当前用户且不允许其他用户访问"""
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    st = os.lstat(path)
+    if not stat.S_ISDIR(st.st_mode):
+        raise OSError(f"{path} 不是目录")
+    if hasattr(os, 'getuid') and st.st_uid != os.getuid():
+        raise OSError(f"{path} 不属于当前用户")
+    if stat.S_IMODE(st.st_mode) & 0o077:
+        raise OSError(f"{path} 允许其他用户访问")
+
+
+@lru_cache(maxsize=None)
+def _get_jinja_env(template_dir: str) -> Environment:
+    """获取模板目录对应的共享 Jinja2 环境（模板是否更新由 NginxManager 按 mtime 判断）"""
+    # 缓存文件会被 marshal 加载执行，目录必须不能被其他用户写入
+    try:
+        if JINJA_BC_CACHE_DIR:
+            _ensure_private_dir(JINJA_BC_CACHE_DIR)
+            bytecode_cache = FileSystemBytecodeCache(directory=JINJA_BC_CACHE_DIR)
+        else:
+            bytecode_cache = FileSystemBytecodeCache()
+    except (OSError, RuntimeError) as e:
+        logger.warning(f"无法使用模板字节码缓存目录: {str(e)}")
+        bytecode_cache = None
+    
+    return Environment(
+        loader=FileSystemLoader(template_dir),
+        auto_reload=False,
+        cache_size=400,
+        bytecode_cache=bytecode_cache
+    )
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """通过 Unix 套接字通信的 HTTP 连接，用于访问 Docker API"""
+    
+    def __init__(self, sock_path: str, timeout: float = DOCKER_API_TIMEOUT):
+        super().__init__('docker', timeout=timeout)
+        self.sock_path = sock_path
+    
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.sock_path)
+        except OSError:
+            sock.close()
+            raise
+        self.sock = sock
+
+
+def _demux_docker_stream(data: bytes) -> bytes:
+    """
+    解析 Docker 多路复用的输出流，按顺序合并 stdout 和 stderr
+    
+    非 TTY 模式下每一帧以 8 字节头开始：流类型（1 字节）、3 字节 0、负载长度（4 字节大端序）。
+    数据不符合该格式时（例如 TTY 模式的原始输出）原样返回。
+    """
+    chunks = []
+    view = memoryview(data)
+    offset = 0
+    while offset < len(data):
+        if len(data) - offset < 8 or data[offset] > 2 or data[offset + 1:offset + 4] != b"\0\0\0":
+            return data
+        size = int.from_bytes(view[offset + 4:offset + 8], 'big')
+        chunks.append(view[offset + 8:offset + 8 + size])
+        offset += 8 + size
+    return b"".join(chunks)
+
+
+@lru_cache(maxsize=1)
+def _detect_docker() -> bool:
+    """检测是否在 Docker 环境中运行（进程内只检测一次）"""
+    # 检查 /.dockerenv 文件
+    if os.path.exists('/.dockerenv'):
+        return True
+    
+    # 检查 /proc/1/cgroup（非 Linux 系统上不存在，无需尝试打开）
+    if os.path.exists('/proc/1/cgroup'):
+        try:
+            with open('/proc/1/cgroup', 'r') as f:
+                return 'docker' in f.read()
+        except OSError:
+            pass
+    
+    # 检查环境变量
+    return os.getenv('DOCKER_CONTAINER') == 'true'
+
+
+# 是否运行在 Docker 环境中，以及 Nginx 容器名称（模块导入时确定）
+IS_DOCKER = _detect_docker()
+NGINX_CONTAINER = os.getenv('NGINX_CONTAINER_NAME', 'nginx-proxy-manager-nginx')
+
 
 class NginxManager:
     """Nginx 配置管理器"""
@@ -26,121 +153,203 @@ class NginxManager:
         self,
         template_path: str = "nginx/nginx.conf.template",
         output_path: str = "nginx/proxy_rules.conf",
-        nginx_bin: str = "nginx"
+        nginx_bin: str = "nginx",
+        config_manager: Optional[ConfigManager] = None
     ):
         self.template_path = Path(template_path)
         self.output_path = Path(output_path)
         self.nginx_bin = nginx_bin
-        self.config_manager = ConfigManager()
+        self.config_manager = config_manager or ConfigManager()
         
-        # 检测是否在 Docker 环境中
-        self.is_docker = self._detect_docker_environment()
-        self.nginx_container = os.getenv('NGINX_CONTAINER_NAME', 'nginx-proxy-manager-nginx')
-    
-    def _detect_docker_environment(self) -> bool:
-        """检测是否在 Docker 环境中运行"""
-        # 检查 /.dockerenv 文件
-        if os.path.exists('/.dockerenv'):
-            return True
+        # 编译后的模板缓存，以模板文件的 st_mtime_ns 作为失效依据
+        self._template_cache: Optional[Template] = None
+        self._template_mtime = None
+        
+        # 容器内的常驻 shell，避免每条命令都启动一次 docker CLI
+        self._shell: Optional[subprocess.Popen] = None
+        self._shell_lock = threading.Lock()
+        self._shell_atexit_registered = False
         
-        # 检查 /proc/1/cgroup
+        # 与 Docker API 的空闲 keep-alive 连接；每个请求独占一个连接，并发请求各自使用不同的连接
+        self._api_conns: List[UnixHTTPConnection] = []
+        self._api_lock = threading.Lock()
+        
+        # 容器运行状态缓存：(过期时间, 是否运行)
+        self._container_running_cache: Optional[tuple[float, bool]] = None
+        
+        # 状态信息中不随运行过程变化的部分：Nginx 版本，以及 (过期时间, 模板文件是否存在)
+        self._version: Optional[str] = None
+        self._template_exists_cache: Optional[tuple[float, bool]] = None
+        
+        # 正在排队等待执行的重载，期间到达的重载请求直接复用其结果
+        self._pending_reload: Optional[asyncio.Future] = None
+        
+        # 运行环境在进程内不会变化，使用模块导入时确定的值
+        self.is_docker = IS_DOCKER
+        self.nginx_container = NGINX_CONTAINER
+    
+    def _get_shell(self) -> subprocess.Popen:
+        """获取容器内的常驻 shell，进程不存在或已退出时重新启动"""
+        if self._shell is None or self._shell.poll() is not None:
+            self._shell = subprocess.Popen(
+                ['docker', 'exec', '-i', self.nginx_container, 'sh'],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                bufsize=0
+            )
+            if not self._shell_atexit_registered:
+                atexit.register(self._close_shell)
+                self._shell_atexit_registered = True
+        return self._shell
+    
+    def _close_shell(self):
+        """结束容器内的常驻 shell"""
+        shell, self._shell = self._shell, None
+        if shell is None or shell.poll() is not None:
+            return
         try:
-            with open('/proc/1/cgroup', 'r') as f:
-                return 'docker' in f.read()
-        except:
-            pass
+            shell.stdin.close()
+            shell.wait(timeout=1)
+        except (OSError, subprocess.TimeoutExpired):
+            shell.kill()
+    
+    def _shell_run(self, command: List[str], timeout: float = 10) -> tuple[int, str]:
+        """在容器内的常驻 shell 中执行命令；返回 (exit_code, output)，stderr 合并到 output"""
+        command_line = " ".join(shlex.quote(arg) for arg in command)
+        # 命令的标准输入重定向到 /dev/null，避免读走后续写入 shell 的命令
+        script = f"{command_line} </dev/null 2>&1; rc=$?; echo; echo {SHELL_END_MARKER.decode()}$rc\n".encode('utf-8')
         
-        # 检查环境变量
-        return os.getenv('DOCKER_CONTAINER') == 'true'
+        with self._shell_lock:
+            shell = self._get_shell()
+            try:
+                shell.stdin.write(script)
+            except BrokenPipeError:
+                # shell 已退出（例如容器重启），重新启动后再试一次
+                self._close_shell()
+                shell = self._get_shell()
+                shell.stdin.write(script)
+            
+            fd = shell.stdout.fileno()
+            deadline = time.monotonic() + timeout
+            buffer = b""
+            while True:
+                marker = buffer.find(b"\n" + SHELL_END_MARKER)
+                if marker != -1:
+                    code_start = marker + 1 + len(SHELL_END_MARKER)
+                    code_end = buffer.find(b"\n", code_start)
+                    if code_end != -1:
+                        exit_code = int(buffer[code_start:code_end])
+                        return exit_code, buffer[:marker].decode('utf-8', errors='replace')
+                
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not select.select([fd], [], [], remaining)[0]:
+                    self._close_shell()
+                    raise subprocess.TimeoutExpired(command, timeout)
+                
+                chunk = os.read(fd, 4096)
+                if not chunk:
+                    # shell 意外退出（例如容器未运行），输出中包含 docker 的错误信息
+                    exit_code = shell.wait()
+                    self._shell = None
+                    return exit_code or 1, buffer.decode('utf-8', errors='replace')
+                buffer += chunk
+    
+    def _exec_in_container(self, command: List[str]) -> tuple[int, str]:
+        """在 Nginx 容器内执行命令；优先直接调用 Docker API，不可用时使用常驻 shell"""
+        if os.path.exists(DOCKER_SOCK_PATH):
+            return self._docker_api_exec_cmd(command)
+        return self._shell_run(command)
     
     def _run_docker_command(self, command: List[str]) -> subprocess.CompletedProcess:
-        """在 Docker 容器中执行命令"""
-        docker_cmd = ['docker', 'exec', self.nginx_container] + command
-        return subprocess.run(
-            docker_cmd,
-            capture_output=True,
-            text=True,
-            timeout=10
-        )
+        """在 Docker 容器中执行命令（stdout 和 stderr 均为合并后的输出）"""
+        exit_code, output = self._exec_in_container(command)
+        return subprocess.CompletedProcess(command, exit_code, stdout=output, stderr=output)
+    
+    def _docker_api_request(self, method: str, path: str, body: Optional[dict] = None) -> tuple[int, bytes]:
+        """向 Docker API 发送请求并复用 keep-alive 连接；返回 (status, body)"""
+        payload = json.dumps(body).encode('utf-8') if body is not None else None
+        headers = {'Content-Type': 'application/json'} if payload is not None else {}
+        
+        conn = self._acquire_api_conn()
+        try:
+            for attempt in range(2):
+                reused = conn.sock is not None
+                try:
+                    conn.request(method, path, body=payload, headers=headers)
+                    resp = conn.getresponse()
+                    # exec start 等接口在输出结束后关闭连接，http.client 会在下次请求时自动重连
+                    return resp.status, resp.read()
+                except (ConnectionError, http.client.RemoteDisconnected):
+                    conn.close()
+                    # 复用的空闲连接可能已被服务端关闭，重新连接后再试一次
+                    if reused and attempt == 0:
+                        continue
+                    raise
+                except Exception:
+                    conn.close()
+                    raise
+        finally:
+            self._release_api_conn(conn)
+    
+    def _acquire_api_conn(self) -> UnixHTTPConnection:
+        """取出一个空闲的 Docker API 连接，没有空闲连接时新建（实际连接在首次请求时建立）"""
+        with self._api_lock:
+            if self._api_conns:
+                return self._api_conns.pop()
+        return UnixHTTPConnection(DOCKER_SOCK_PATH, timeout=DOCKER_API_TIMEOUT)
+    
+    def _release_api_conn(self, conn: UnixHTTPConnection):
+        """归还 Docker API 连接，空闲连接超过 DOCKER_API_MAX_IDLE 个时直接关闭"""
+        with self._api_lock:
+            if len(self._api_conns) < DOCKER_API_MAX_IDLE:
+                self._api_conns.append(conn)
+                return
+        conn.close()
     
     def _docker_api_exec_cmd(self, cmd: List[str]) -> tuple[int, str]:
         """通过 Docker API 在容器内执行命令；返回 (exit_code, output)"""
         try:
-            sock_path = '/var/run/docker.sock'
-            
             # 创建 exec
-            req_data = json.dumps({
+            status, body = self._docker_api_request('POST', f"/containers/{self.nginx_container}/exec", {
                 'AttachStdout': True, 'AttachStderr': True,
                 'Tty': False, 'Cmd': cmd
-            }).encode('utf-8')
-            req = (f"POST /containers/{self.nginx_container}/exec HTTP/1.1\r\n"
-                   "Host: docker\r\n"
-                   f"Content-Type: application/json\r\n"
-                   f"Content-Length: {len(req_data)}\r\n\r\n").encode('utf-8') + req_data
-            
-            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
-            sock.connect(sock_path)
-            sock.sendall(req)
-            resp = b''
-            while True:
-                chunk = sock.recv(4096)
-                if not chunk: break
-                resp += chunk
-            sock.close()
-            
-            body = resp.split(b'\r\n\r\n', 1)[1] if b'\r\n\r\n' in resp else resp
-            exec_info = json.loads(body.decode('utf-8'))
-            exec_id = exec_info.get('Id', '')
+            })
+            exec_id = json.loads(body.decode('utf-8')).get('Id', '') if status == 201 else ''
             
             if not exec_id:
                 return 1, "无法创建 exec"
             
-            # 启动 exec
-            req = (f"POST /exec/{exec_id}/start HTTP/1.1\r\n"
-                   "Host: docker\r\nContent-Type: application/json\r\n"
-                   "Content-Length: 41\r\n\r\n"
-                   '{"Detach":false,"Tty":false}').encode('utf-8')
-            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
-            sock.connect(sock_path)
-            sock.sendall(req)
-            
-            output = b''
-            while True:
-                chunk = sock.recv(4096)
-                if not chunk: break
-                output += chunk
-            sock.close()
+            # 启动 exec，响应体为命令的输出，命令结束后连接关闭
+            _, stream = self._docker_api_request('POST', f"/exec/{exec_id}/start", {'Detach': False, 'Tty': False})
+            output = _demux_docker_stream(stream)
             
             # 获取退出码
-            req = f"GET /exec/{exec_id}/json HTTP/1.1\r\nHost: docker\r\n\r\n".encode('utf-8')
-            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
-            sock.connect(sock_path)
-            sock.sendall(req)
-            resp = b''
-            while True:
-                chunk = sock.recv(4096)
-                if not chunk: break
-                resp += chunk
-            sock.close()
+            _, body = self._docker_api_request('GET', f"/exec/{exec_id}/json")
+            exit_code = json.loads(body.decode('utf-8')).get('ExitCode')
             
-            body = resp.split(b'\r\n\r\n', 1)[1] if b'\r\n\r\n' in resp else resp
-            exit_info = json.loads(body.decode('utf-8'))
-            exit_code = exit_info.get('ExitCode', 1)
-
-            out_str = output.decode('utf-8', errors='ignore').split('\r\n\r\n', 1)[-1]
-            return exit_code, out_str
+            return (1 if exit_code is None else exit_code), output.decode('utf-8', errors='ignore')
         except Exception as e:
             return 1, f"Docker API 调用失败: {str(e)}"
     
     def _load_template(self) -> Template:
-        """加载 Nginx 配置模板"""
-        if not self.template_path.exists():
+        """加载 Nginx 配置模板（模板文件未修改时直接返回编译好的模板）"""
+        try:
+            mtime = self.template_path.stat().st_mtime_ns
+        except FileNotFoundError:
             raise FileNotFoundError(f"模板文件不存在: {self.template_path}")
         
-        with open(self.template_path, 'r', encoding='utf-8') as f:
-            template_content = f.read()
+        if self._template_cache is not None and mtime == self._template_mtime:
+            return self._template_cache
         
-        return Template(template_content)
+        # 共享环境关闭了 auto_reload，模板文件变化时先清除其内存缓存，
+        # 源码的校验和变化后字节码缓存也会自动重新编译
+        env = _get_jinja_env(str(self.template_path.parent))
+        env.cache.clear()
+        
+        self._template_cache = env.get_template(self.template_path.name)
+        self._template_mtime = mtime
+        return self._template_cache
     
     def generate_config(self, rules: Optional[List[ProxyRule]] = None) -> str:
         """生成 Nginx 配置内容"""
@@ -148,14 +357,14 @@ class NginxManager:
             rules = self.config_manager.get_enabled_rules()
         
         template = self._load_template()
-        
-        # 准备模板数据
-        template_data = {
+        return template.render(**self._template_data(rules))
+    
+    def _template_data(self, rules: List[ProxyRule]) -> dict:
+        """准备模板数据（规则直接以模型传入，模板中的属性访问无需回退到字典取值）"""
+        return {
             "rules": rules,
-            "timestamp": __import__('datetime').datetime.now().isoformat()
+            "timestamp": datetime.now().isoformat()
         }
-        
-        return template.render(**template_data)
     
     def read_config_file(self) -> Optional[str]:
         """读取当前的 Nginx 配置文件内容（简化版本）"""
@@ -170,14 +379,15 @@ class NginxManager:
             logger.error(f"读取配置文件失败: {str(e)}")
             return None
     
-    def log_config_content(self, operation: str):
-        """打印配置文件内容到日志"""
+    def log_config_content(self, operation: str, content: Optional[str] = None):
+        """打印配置文件内容到日志，传入 content 时直接使用，不再读取文件"""
         logger.info(f"=" * 80)
         logger.info(f"操作: {operation}")
         logger.info(f"配置文件路径: {self.output_path}")
         logger.info(f"-" * 80)
         
-        content = self.read_config_file()
+        if content is None:
+            content = self.read_config_file()
         if content:
             logger.info("配置文件内容:")
             logger.info(content)
@@ -193,6 +403,9 @@ class NginxManager:
             # 这样无论是否在容器内，都直接写入挂载的配置文件
             self.output_path.parent.mkdir(parents=True, exist_ok=True)
             
+            # 不能写临时文件再 os.replace：配置以单文件方式挂载进 Nginx 容器，
+            # 替换会换掉 inode，容器内看不到新文件，inotify 的 close_write 监听也会失效。
+            # 调用方传入的是完整渲染好的内容，这里一次写入，渲染出错时不会截断原文件
             with open(self.output_path, 'w', encoding='utf-8') as f:
                 f.write(config_content)
             
@@ -204,32 +417,55 @@ class NginxManager:
         except Exception as e:
             raise Exception(f"写入配置文件失败: {str(e)}")
     
+    async def _run_async(self, argv: List[str], timeout: float = 10) -> subprocess.CompletedProcess:
+        """异步执行本地命令，不阻塞事件循环；用法与 subprocess.run(capture_output=True, text=True) 一致"""
+        proc = await asyncio.create_subprocess_exec(
+            *argv,
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
+        )
+        try:
+            stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout)
+        except asyncio.TimeoutError:
+            proc.kill()
+            await proc.wait()
+            raise subprocess.TimeoutExpired(argv, timeout)
+        
+        return subprocess.CompletedProcess(
+            argv,
+            proc.returncode,
+            stdout=stdout.decode('utf-8', errors='replace'),
+            stderr=stderr.decode('utf-8', errors='replace')
+        )
+    
+    async def _exec_in_container_async(self, command: List[str]) -> tuple[int, str]:
+        """在 Nginx 容器内执行命令；Docker API 和常驻 shell 均为阻塞 I/O，放到线程中执行"""
+        return await asyncio.to_thread(self._exec_in_container, command)
+    
+    async def _run_docker_command_async(self, command: List[str]) -> subprocess.CompletedProcess:
+        """_run_docker_command 的异步版本"""
+        return await asyncio.to_thread(self._run_docker_command, command)
+    
     def test_config(self) -> tuple[bool, Optional[str]]:
+        """测试 Nginx 配置语法（供同步调用方使用）"""
+        return asyncio.run(self.test_config_async())
+    
+    async def test_config_async(self) -> tuple[bool, Optional[str]]:
         """测试 Nginx 配置语法（简化版本）"""
         try:
             if self.is_docker:
-                # Docker 环境：通过 docker exec 测试配置
+                # Docker 环境：在容器内测试配置
                 try:
-                    result = subprocess.run(
-                        ['docker', 'exec', self.nginx_container, self.nginx_bin, '-t'],
-                        capture_output=True,
-                        text=True,
-                        timeout=10
-                    )
-                    output = result.stderr or result.stdout
-                    return (result.returncode == 0, output)
+                    exit_code, output = await self._exec_in_container_async([self.nginx_bin, '-t'])
+                    return (exit_code == 0, output)
                 except FileNotFoundError:
                     # docker 命令不存在，跳过测试
                     logger.warning("Docker 命令不可用，跳过配置测试")
                     return True, "配置测试跳过（Docker 不可用）"
             else:
                 # 本地环境：直接测试
-                result = subprocess.run(
-                    [self.nginx_bin, '-t'],
-                    capture_output=True,
-                    text=True,
-                    timeout=10
-                )
+                result = await self._run_async([self.nginx_bin, '-t'], timeout=10)
                 output = result.stderr or result.stdout
                 return (result.returncode == 0, output)
                 
@@ -243,22 +479,30 @@ class NginxManager:
             return False, f"配置测试失败: {str(e)}"
     
     def reload_nginx(self) -> NginxReloadResponse:
+        """重载 Nginx 配置（供同步调用方使用）"""
+        return asyncio.run(self.reload_nginx_async())
+    
+    async def reload_nginx_async(self) -> NginxReloadResponse:
         """重载 Nginx 配置（简化版本）"""
+        return await self._run_reload_async([self.nginx_bin, '-s', 'reload'])
+    
+    async def _test_and_reload_async(self) -> NginxReloadResponse:
+        """测试配置语法并在通过后重载 Nginx，两步合并为一次命令执行"""
+        nginx_bin = shlex.quote(self.nginx_bin)
+        return await self._run_reload_async(['sh', '-c', f"{nginx_bin} -t 2>&1 && {nginx_bin} -s reload 2>&1"])
+    
+    async def _run_reload_async(self, command: List[str]) -> NginxReloadResponse:
+        """执行重载命令并转换为重载结果"""
         try:
             # 简化方案：直接通过 docker exec 发送 reload 信号
             # 配置文件已通过 volume 挂载，NGINX 会自动读取
             
             if self.is_docker:
-                # Docker 环境：发送 reload 信号到容器
+                # Docker 环境：在容器内发送 reload 信号
                 try:
-                    result = subprocess.run(
-                        ['docker', 'exec', self.nginx_container, self.nginx_bin, '-s', 'reload'],
-                        capture_output=True,
-                        text=True,
-                        timeout=10
-                    )
+                    exit_code, output = await self._exec_in_container_async(command)
                     
-                    if result.returncode == 0:
+                    if exit_code == 0:
                         logger.info("Nginx 重载信号发送成功")
                         return NginxReloadResponse(
                             success=True,
@@ -266,7 +510,7 @@ class NginxManager:
                             config_path=str(self.output_path)
                         )
                     else:
-                        error_msg = result.stderr or result.stdout
+                        error_msg = output
                         logger.error(f"Nginx 重载失败: {error_msg}")
                         return NginxReloadResponse(
                             success=False,
@@ -284,12 +528,7 @@ class NginxManager:
                     )
             else:
                 # 本地环境：直接执行 reload
-                result = subprocess.run(
-                    [self.nginx_bin, '-s', 'reload'],
-                    capture_output=True,
-                    text=True,
-                    timeout=10
-                )
+                result = await self._run_async(command, timeout=10)
                 
                 if result.returncode == 0:
                     return NginxReloadResponse(
@@ -318,44 +557,69 @@ class NginxManager:
                 error=str(e)
             )
     
+    def _write_new_config(self) -> tuple[str, Optional[bytes]]:
+        """生成并写入新配置；返回 (新配置内容, 写入前的配置内容)"""
+        # 在内存中备份当前配置（如果存在）
+        old_content = self.output_path.read_bytes() if self.output_path.exists() else None
+        
+        # 完整渲染为字符串后再写入，渲染中途出错时不会留下不完整的配置；
+        # write_config 原地覆盖写入，保持单文件挂载和 inotify 监听的 inode 不变
+        config_content = self.generate_config()
+        self.write_config(config_content)
+        
+        # 日志直接使用渲染结果，不再回读文件
+        self.log_config_content("写入配置后", content=config_content)
+        return config_content, old_content
+    
     def update_and_reload(self) -> NginxReloadResponse:
-        """更新配置并重载 Nginx"""
+        """更新配置并重载 Nginx（供同步调用方使用）"""
+        return asyncio.run(self.update_and_reload_async())
+    
+    async def update_and_reload_async(self) -> NginxReloadResponse:
+        """更新配置并重载 Nginx，同一时间只执行一次，排队中的重复请求会被合并"""
+        # 已有排队等待的重载时直接等待它的结果，它开始执行时才读取规则，已包含本次的修改
+        if self._pending_reload is not None:
+            return await asyncio.shield(self._pending_reload)
+        
+        pending = asyncio.get_running_loop().create_future()
+        self._pending_reload = pending
+        try:
+            async with _reload_lock:
+                # 开始执行后，之后到达的请求需要等待下一次重载
+                if self._pending_reload is pending:
+                    self._pending_reload = None
+                result = await self._update_and_reload_locked()
+        except BaseException:
+            if self._pending_reload is pending:
+                self._pending_reload = None
+            pending.cancel()
+            raise
+        
+        pending.set_result(result)
+        return result
+    
+    async def _update_and_reload_locked(self) -> NginxReloadResponse:
+        """更新配置并重载 Nginx（调用方需持有 _reload_lock）"""
         try:
             logger.info("开始更新配置并重载 Nginx")
             
-            # 生成新配置
-            config_content = self.generate_config()
-            logger.info(f"已生成新配置，共 {len(config_content)} 字符")
-            
-            # 备份当前配置（如果存在）
-            if self.output_path.exists():
-                backup_path = self.output_path.with_suffix('.conf.backup')
-                import shutil
-                shutil.copy2(self.output_path, backup_path)
-                logger.info(f"已备份当前配置到: {backup_path}")
-            
-            # 写入新配置
-            self.write_config(config_content)
+            # 读取规则、渲染模板和写文件都是阻塞操作，放到线程中执行
+            config_content, old_content = await asyncio.to_thread(self._write_new_config)
             
-            # 打印配置文件内容
-            self.log_config_content("写入配置后")
-            
-            # 重载 Nginx
-            result = self.reload_nginx()
+            # 测试配置并重载 Nginx，配置有误时不会发送重载信号
+            result = await self._test_and_reload_async()
             
             # 如果重载失败，恢复备份
             if not result.success:
                 logger.error(f"Nginx 重载失败: {result.error}")
-                backup_path = self.output_path.with_suffix('.conf.backup')
-                if backup_path.exists():
-                    import shutil
-                    shutil.copy2(backup_path, self.output_path)
+                if old_content is not None:
+                    await asyncio.to_thread(self.output_path.write_bytes, old_content)
                     result.message += " (已恢复备份配置)"
                     logger.info("已恢复备份配置")
             else:
                 logger.info("Nginx 重载成功")
                 # 重载成功后再次打印配置内容确认
-                self.log_config_content("重载 Nginx 后")
+                self.log_config_content("重载 Nginx 后", content=config_content)
             
             return result
             
@@ -367,49 +631,122 @@ class NginxManager:
                 error=str(e)
             )
     
+    def _container_state(self) -> dict:
+        """通过 Docker API 获取 Nginx 容器的 State，容器不存在时返回空字典"""
+        status, body = self._docker_api_request('GET', f"/containers/{self.nginx_container}/json")
+        if status != 200:
+            return {}
+        return json.loads(body.decode('utf-8')).get('State', {})
+    
+    async def _container_running_async(self) -> bool:
+        """检查 Nginx 容器是否在运行，结果缓存 CONTAINER_STATE_TTL 秒"""
+        now = time.monotonic()
+        cached = self._container_running_cache
+        if cached is not None and cached[0] > now:
+            return cached[1]
+        
+        # Docker API 可用时直接查询，避免启动 docker CLI
+        if os.path.exists(DOCKER_SOCK_PATH):
+            state = await asyncio.to_thread(self._container_state)
+            is_running = bool(state.get('Running', False))
+        else:
+            check_container = await self._run_async(
+                ['docker', 'ps', '--filter', f'name={self.nginx_container}', '--format', '{{.Names}}'],
+                timeout=5
+            )
+            is_running = self.nginx_container in check_container.stdout
+        
+        self._container_running_cache = (time.monotonic() + CONTAINER_STATE_TTL, is_running)
+        return is_running
+    
+    @staticmethod
+    def _nginx_running_local() -> Optional[bool]:
+        """扫描 /proc 判断本机是否有 nginx 进程，/proc 不可用时返回 None"""
+        try:
+            pids = [pid for pid in os.listdir('/proc') if pid.isdigit()]
+        except OSError:
+            return None
+        
+        def is_nginx(pid: str) -> bool:
+            try:
+                with open(f'/proc/{pid}/comm', 'r') as f:
+                    return f.read().strip() == 'nginx'
+            except OSError:
+                # 扫描过程中进程可能已经退出
+                return False
+        
+        return any(is_nginx(pid) for pid in pids)
+    
+    async def _nginx_running_local_async(self) -> bool:
+        """检查本机 Nginx 进程是否在运行，非 Linux 系统上回退到 pgrep"""
+        is_running = await asyncio.to_thread(self._nginx_running_local)
+        if is_running is not None:
+            return is_running
+        
+        result = await self._run_async(['pgrep', '-x', 'nginx'], timeout=5)
+        return result.returncode == 0
+    
+    async def _nginx_version_async(self) -> str:
+        """获取 Nginx 版本，成功获取后在进程内缓存"""
+        if self._version is None:
+            if self.is_docker:
+                result = await self._run_docker_command_async([self.nginx_bin, '-v'])
+            else:
+                result = await self._run_async([self.nginx_bin, '-v'], timeout=5)
+            if result.returncode != 0:
+                return "未知"
+            self._version = result.stderr.strip()
+        return self._version
+    
+    def _template_exists(self) -> bool:
+        """模板文件是否存在，结果缓存 TEMPLATE_EXISTS_TTL 秒"""
+        now = time.monotonic()
+        cached = self._template_exists_cache
+        if cached is None or cached[0] <= now:
+            cached = (now + TEMPLATE_EXISTS_TTL, self.template_path.exists())
+            self._template_exists_cache = cached
+        return cached[1]
+    
+    def invalidate_status_cache(self):
+        """清除状态信息的缓存（例如升级 Nginx 或替换模板后，可通过 SIGHUP 触发）"""
+        self._version = None
+        self._template_exists_cache = None
+        self._container_running_cache = None
+    
     def get_nginx_status(self) -> dict:
+        """获取 Nginx 状态信息（供同步调用方使用）"""
+        return asyncio.run(self.get_nginx_status_async())
+    
+    async def get_nginx_status_async(self) -> dict:
         """获取 Nginx 状态信息"""
         try:
             if self.is_docker:
-                # Docker 环境：检查容器状态
-                check_container = subprocess.run(
-                    ['docker', 'ps', '--filter', f'name={self.nginx_container}', '--format', '{{.Names}}'],
-                    capture_output=True,
-                    text=True,
-                    timeout=5
+                # Docker 环境：容器状态、Nginx 版本和配置文件三项检查互不依赖，同时进行
+                is_running, version, check_file = await asyncio.gather(
+                    self._container_running_async(),
+                    self._nginx_version_async(),
+                    self._run_docker_command_async(['test', '-f', str(self.output_path)]),
+                    return_exceptions=True
                 )
-                is_running = self.nginx_container in check_container.stdout
-                
-                # 获取 Nginx 版本
-                if is_running:
-                    version_result = self._run_docker_command([self.nginx_bin, '-v'])
-                    version = version_result.stderr.strip() if version_result.returncode == 0 else "未知"
-                else:
-                    version = "容器未运行"
+                if isinstance(is_running, BaseException):
+                    raise is_running
                 
-                # 检查配置文件是否存在
                 if is_running:
-                    check_file = self._run_docker_command(['test', '-f', str(self.output_path)])
+                    for probe in (version, check_file):
+                        if isinstance(probe, BaseException):
+                            raise probe
+                    # 检查配置文件是否存在
                     config_exists = check_file.returncode == 0
                 else:
+                    # 容器未运行时忽略另外两项检查的结果
+                    version = "容器未运行"
                     config_exists = False
             else:
-                # 本地环境
-                result = subprocess.run(
-                    ['pgrep', '-x', 'nginx'],
-                    capture_output=True,
-                    text=True,
-                    timeout=5
-                )
-                is_running = result.returncode == 0
-                
-                version_result = subprocess.run(
-                    [self.nginx_bin, '-v'],
-                    capture_output=True,
-                    text=True,
-                    timeout=5
+                # 本地环境：进程检查和版本检查同时进行
+                is_running, version = await asyncio.gather(
+                    self._nginx_running_local_async(),
+                    self._nginx_version_async()
                 )
-                version = version_result.stderr.strip() if version_result.returncode == 0 else "未知"
                 config_exists = self.output_path.exists()
             
             return {
@@ -418,7 +755,7 @@ class NginxManager:
                 "config_path": str(self.output_path),
                 "config_exists": config_exists,
                 "template_path": str(self.template_path),
-                "template_exists": self.template_path.exists(),
+                "template_exists": self._template_exists(),
                 "environment": "docker" if self.is_docker else "local"
             }
             
@@ -432,19 +769,19 @@ class NginxManager:
     def validate_rules_for_nginx(self, rules: List[ProxyRule]) -> tuple[bool, Optional[str]]:
         """验证规则是否适合生成 Nginx 配置"""
         # 检查路径冲突
-        paths = set()
-        for rule in rules:
-            if rule.path in paths:
-                return False, f"路径冲突: {rule.path}"
-            paths.add(rule.path)
-            
-            # 检查路径格式
-            if not rule.path.startswith('/'):
-                return False, f"路径必须以 / 开头: {rule.path}"
-            
-            # 检查端口范围
-            if not (1 <= rule.target_port <= 65535):
-                return False, f"端口超出范围: {rule.target_port}"
+        paths = [rule.path for rule in rules]
+        duplicate = next((path for path, count in Counter(paths).items() if count > 1), None)
+        if duplicate is not None:
+            return False, f"路径冲突: {duplicate}"
+        
+        # 检查路径格式
+        bad_path = next((path for path in paths if not path.startswith('/')), None)
+        if bad_path is not None:
+            return False, f"路径必须以 / 开头: {bad_path}"
+        
+        # 检查端口范围
+        bad_port = next((port for port in (rule.target_port for rule in rules) if not 1 <= port <= 65535), None)
+        if bad_port is not None:
+            return False, f"端口超出范围: {bad_port}"
         
         return True, None
-
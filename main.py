@@ -2,15 +2,28 @@
 NGINX 代理配置管理系统 - FastAPI 主应用
 """
 import os
+import asyncio
+import hashlib
+import hmac
+import json
 import logging
+import logging.handlers
+import queue
+import signal
 import sys
+from email.utils import formatdate
+from urllib.parse import unquote_to_bytes
 from fastapi import FastAPI, Request
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse, JSONResponse
-from starlette.middleware.base import BaseHTTPMiddleware
+from fastapi.responses import Response
+from starlette.middleware.gzip import GZipMiddleware
+from starlette.types import ASGIApp, Receive, Scope, Send
 from contextlib import asynccontextmanager
 from app.api.routes import router
-from app.health_check import health_checker
+from app.api.batch import router as batch_router
+from app.config_manager import ConfigManager
+from app.nginx_manager import NginxManager
+from app.health_check import HealthChecker
 
 # 配置日志
 logging.basicConfig(
@@ -24,49 +37,178 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 ACCESS_TOKEN = os.getenv('ACCESS_TOKEN', 'changeme')
+_ACCESS_TOKEN_BYTES = ACCESS_TOKEN.encode('utf-8')
+_BEARER = b'Bearer '
+_TOKEN_PARAM = b'token='
 
+# 无需验证的路径（PUBLIC_PATHS 及其子路径），实际匹配使用下面预先计算的集合与前缀
 PUBLIC_PATHS = ['/health', '/api/auth/verify', '/api/monitor', '/assets']
 
+# 精确匹配：公开路径本身以及首页、管理页面
+_EXACT_PUBLIC = frozenset(PUBLIC_PATHS + ['/', '/admin'])
+# 前缀匹配：公开路径的子路径以及静态资源（与原逻辑一致，/static 为纯前缀匹配）
+_PREFIX_PUBLIC = tuple(public_path + '/' for public_path in PUBLIC_PATHS) + ('/static',)
+
+class CachedResponse(Response):
+    """跨请求复用的固定响应，每次发送头部列表的副本，避免 GZip 等中间件原地修改共享的头部"""
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        await send({"type": "http.response.start", "status": self.status_code, "headers": list(self.raw_headers)})
+        await send({"type": "http.response.body", "body": self.body})
+
+
+# 未授权响应的内容固定不变，预先编码（与 JSONResponse 的编码方式一致）
+UNAUTHORIZED_BODY = json.dumps(
+    {"detail": "未授权访问，请提供有效的 Token"}, ensure_ascii=False, separators=(",", ":")
+).encode("utf-8")
+UNAUTHORIZED_HEADERS = [
+    (b"content-length", str(len(UNAUTHORIZED_BODY)).encode("latin-1")),
+    (b"content-type", b"application/json"),
+]
+
+# 健康检查响应同样固定不变，构造一次后每次请求直接复用
+HEALTH_BODY = json.dumps(
+    {"status": "healthy", "service": "nginx-proxy-manager"}, ensure_ascii=False, separators=(",", ":")
+).encode("utf-8")
+HEALTH_RESPONSE = CachedResponse(content=HEALTH_BODY, media_type="application/json")
+HEALTH_HEADERS = [
+    (b"content-length", str(len(HEALTH_BODY)).encode("latin-1")),
+    (b"content-type", b"application/json"),
+]
+
+# Token 校验接口的两种结果也是固定内容
+VERIFY_SUCCESS_RESPONSE = CachedResponse(
+    content=json.dumps({"success": True, "message": "Token 验证成功"}, ensure_ascii=False, separators=(",", ":")).encode("utf-8"),
+    media_type="application/json"
+)
+VERIFY_FAILURE_RESPONSE = CachedResponse(
+    content=json.dumps({"success": False, "message": "Token 无效"}, ensure_ascii=False, separators=(",", ":")).encode("utf-8"),
+    status_code=401,
+    media_type="application/json"
+)
+
+
+def _query_token(query_string: bytes) -> bytes:
+    """从原始查询字符串中取出 token 参数（与 Request.query_params 一致，同名参数取最后一个）"""
+    if _TOKEN_PARAM not in query_string:
+        return b''
+
+    token = b''
+    for pair in query_string.split(b'&'):
+        if pair.startswith(_TOKEN_PARAM):
+            token = pair[6:]
 
-class TokenAuthMiddleware(BaseHTTPMiddleware):
-    """Token 验证中间件，保护所有 API 和页面访问"""
+    # 仅在包含转义字符时才解码
+    if b'%' in token or b'+' in token:
+        token = unquote_to_bytes(token.replace(b'+', b' '))
+    return token
 
-    async def dispatch(self, request: Request, call_next):
-        request_path = request.url.path
 
-        for public_path in PUBLIC_PATHS:
-            if request_path == public_path or request_path.startswith(public_path + '/'):
-                return await call_next(request)
+class TokenAuthMiddleware:
+    """Token 验证中间件，保护所有 API 和页面访问（纯 ASGI 实现，不包装 Request/Response）"""
 
-        if request_path == '/' or request_path == '/admin' or request_path.startswith('/static'):
-            return await call_next(request)
+    def __init__(self, app: ASGIApp):
+        self.app = app
 
-        auth_header = request.headers.get('Authorization', '')
-        if auth_header.startswith('Bearer '):
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        # 绝大多数请求是携带 Token 的 /api 调用，先校验 Token，通过后直接放行；
+        # 只有校验失败时才判断是否为公开路径
+        auth_header = b''
+        for name, value in scope["headers"]:
+            if name == b'authorization':
+                auth_header = value
+                break
+
+        if auth_header.startswith(_BEARER):
             token = auth_header[7:]
         else:
-            token = request.query_params.get('token', '')
+            token = _query_token(scope["query_string"])
+
+        # 直接比较字节串，且使用常量时间比较避免时序侧信道
+        if hmac.compare_digest(token, _ACCESS_TOKEN_BYTES):
+            await self.app(scope, receive, send)
+            return
+
+        request_path = scope["path"]
+        if request_path in _EXACT_PUBLIC or request_path.startswith(_PREFIX_PUBLIC):
+            await self.app(scope, receive, send)
+            return
+
+        await send({"type": "http.response.start", "status": 401, "headers": list(UNAUTHORIZED_HEADERS)})
+        await send({"type": "http.response.body", "body": UNAUTHORIZED_BODY})
+
+
+def _load_page(path: str) -> CachedResponse:
+    """读取页面文件并构造可复用的响应，附带与 FileResponse 相同的 ETag/Last-Modified"""
+    with open(path, 'rb') as f:
+        stat_result = os.fstat(f.fileno())
+        content = f.read()
+    etag = hashlib.md5(f"{stat_result.st_mtime}-{stat_result.st_size}".encode(), usedforsecurity=False).hexdigest()
+    return CachedResponse(
+        content=content,
+        media_type="text/html",
+        headers={"last-modified": formatdate(stat_result.st_mtime, usegmt=True), "etag": f'"{etag}"'}
+    )
+
 
-        if token != ACCESS_TOKEN:
-            return JSONResponse(
-                status_code=401,
-                content={"detail": "未授权访问，请提供有效的 Token"}
-            )
+def _load_pages(app: FastAPI):
+    """将首页和管理页面读入内存，保存到 app.state"""
+    app.state.home_page = _load_page("static/home.html")
+    app.state.admin_page = _load_page("static/index.html")
 
-        return await call_next(request)
+
+def _handle_sighup(app: FastAPI):
+    """SIGHUP：清除 Nginx 状态缓存并重新加载页面文件"""
+    app.state.nginx_manager.invalidate_status_cache()
+    try:
+        _load_pages(app)
+        logger.info("已重新加载页面文件")
+    except OSError as e:
+        # 重新加载失败时继续使用已缓存的页面
+        logger.error(f"重新加载页面文件失败: {e}")
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """应用生命周期管理"""
+    # 日志写入交给后台线程，避免 stdout 阻塞时拖慢事件循环
+    root_logger = logging.getLogger()
+    log_handlers = root_logger.handlers[:]
+    log_queue = queue.SimpleQueue()
+    log_listener = logging.handlers.QueueListener(log_queue, *log_handlers, respect_handler_level=True)
+    root_logger.handlers = [logging.handlers.QueueHandler(log_queue)]
+    log_listener.start()
+
+    # 所有组件共享同一个配置管理器，避免重复解析配置和维护多份缓存
+    config_manager = ConfigManager()
+    app.state.config_manager = config_manager
+    app.state.nginx_manager = NginxManager(config_manager=config_manager)
+    app.state.health_checker = HealthChecker(config_manager=config_manager)
+
+    # 页面文件随镜像发布、运行期间不会变化，启动时读入内存，避免每次请求重新 stat/open
+    _load_pages(app)
+
+    # 收到 SIGHUP 时清除 Nginx 版本等状态缓存并重新加载页面；非主线程或不支持的平台上跳过
+    try:
+        asyncio.get_running_loop().add_signal_handler(signal.SIGHUP, _handle_sighup, app)
+    except (AttributeError, NotImplementedError, RuntimeError, ValueError):
+        pass
+
     logger.info("启动健康检查服务...")
     logger.info("Token 验证已启用")
-    health_checker.start()
+    app.state.health_checker.start()
 
     yield
 
     logger.info("停止健康检查服务...")
-    health_checker.stop()
+    await app.state.health_checker.stop_async()
+
+    log_listener.stop()
+    root_logger.handlers = log_handlers
 
 # 创建 FastAPI 应用
 app = FastAPI(
@@ -79,22 +221,28 @@ app = FastAPI(
 # 添加 Token 验证中间件
 app.add_middleware(TokenAuthMiddleware)
 
+# 压缩较大的响应（监控状态、规则列表、页面等 JSON/HTML 内容重复度高）
+app.add_middleware(GZipMiddleware, minimum_size=512)
+
 # 注册 API 路由
 app.include_router(router)
+app.include_router(batch_router)
 
 # 挂载静态文件目录
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
 
-@app.get("/")
-async def home():
+async def home(request: Request):
     """返回博客首页"""
-    return FileResponse("static/home.html")
+    return request.app.state.home_page
 
-@app.get("/admin")
-async def admin():
+async def admin(request: Request):
     """返回管理页面"""
-    return FileResponse("static/index.html")
+    return request.app.state.admin_page
+
+# 页面直接注册为 Starlette 路由，不经过 FastAPI 的依赖注入和响应模型处理
+app.add_route("/", home, methods=["GET"])
+app.add_route("/admin", admin, methods=["GET"])
 
 
 @app.post("/api/auth/verify")
@@ -107,27 +255,39 @@ async def verify_token(request: Request):
         token = ''
 
     if token == ACCESS_TOKEN:
-        return {"success": True, "message": "Token 验证成功"}
+        return VERIFY_SUCCESS_RESPONSE
     else:
-        return JSONResponse(
-            status_code=401,
-            content={"success": False, "message": "Token 无效"}
-        )
+        return VERIFY_FAILURE_RESPONSE
 
 
-@app.get("/health")
+@app.get("/health", response_class=Response)
 async def health():
     """应用健康检查端点"""
-    return {"status": "healthy", "service": "nginx-proxy-manager"}
+    return HEALTH_RESPONSE
+
+
+async def asgi_app(scope: Scope, receive: Receive, send: Send):
+    """服务入口：/health 存活探测在进入中间件和路由之前直接返回，其余请求交给 FastAPI 应用"""
+    if scope["type"] == "http" and scope["path"] == "/health" and scope["method"] == "GET":
+        await send({"type": "http.response.start", "status": 200, "headers": HEALTH_HEADERS})
+        await send({"type": "http.response.body", "body": HEALTH_BODY})
+        return
+    await app(scope, receive, send)
 
 
 if __name__ == "__main__":
     import uvicorn
+    # 自动重载仅用于开发环境（DEV=1），生产环境不再监视源码变化
+    # 多进程（WORKERS>1）时每个进程都有独立的健康检查、配置写锁和 Nginx 重载锁，
+    # 规则写入和重载不会在进程间互斥，因此默认只启动一个进程
     uvicorn.run(
-        "main:app",
+        "main:asgi_app",
         host="0.0.0.0",
         port=8000,
-        reload=True,
+        loop="auto",  # 已安装 uvloop 时自动使用
+        http="auto",  # 已安装 httptools 时自动使用
+        workers=int(os.getenv("WORKERS", "1")) or None,
+        reload=os.getenv("DEV") == "1",
         log_level="info"
     )
 
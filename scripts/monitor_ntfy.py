@@ -12,6 +12,9 @@
     python3 monitor_ntfy.py          # 前台运行
     nohup python3 monitor_ntfy.py &  # 后台运行
 
+依赖:
+    httpx（安装 h2 后自动启用 HTTP/2）
+
 环境变量:
     MONITOR_URL          - 监控接口地址（默认: https://proxy.banzhe.top/api/monitor/status）
     NTFY_URL             - ntfy 服务地址（默认: https://ntfy.sh）
@@ -26,12 +29,22 @@ import sys
 import json
 import time
 import signal
-import urllib.request
-import urllib.error
+import asyncio
+import logging
 import ssl
-from datetime import datetime
 from pathlib import Path
 
+import httpx
+
+logger = logging.getLogger("monitor_ntfy")
+
+# 安装了 h2 时启用 HTTP/2，否则退回 HTTP/1.1 keep-alive
+try:
+    import h2  # noqa: F401
+    HTTP2_ENABLED = True
+except ImportError:
+    HTTP2_ENABLED = False
+
 MONITOR_URL = os.getenv("MONITOR_URL", "https://proxy.banzhe.top/api/monitor/status")
 NTFY_URL = os.getenv("NTFY_URL", "https://ntfy.sh")
 NTFY_TOPIC = os.getenv("NTFY_TOPIC", "9xjK12pv995OXYl1")
@@ -41,107 +54,136 @@ HEALTHY_INTERVAL = int(os.getenv("HEALTHY_INTERVAL", "21600"))
 
 STATE_FILE = Path("/tmp/monitor_ntfy_state.json")
 
-running = True
+# 创建 SSLContext 需要解析系统 CA 证书，只在启动时创建一次并复用
+_SSL_CTX = ssl.create_default_context()
+
+# 上一次获取到的监控状态及其 ETag，服务端返回 304 时直接复用
+_last_status = {"etag": None, "data": None}
 
 
-def handle_signal(signum, _frame):
+def handle_signal(signum, stop_event):
     """优雅退出"""
-    global running
-    print(f"[{datetime.now()}] 收到信号 {signum}，正在退出...")
-    running = False
+    logger.info(f"收到信号 {signum}，正在退出...")
+    stop_event.set()
+
+
+class MonitorState(dict):
+    """持久化状态，记录自上次保存以来是否有字段发生变化"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.dirty = False
+
+    def __setitem__(self, key, value):
+        if key not in self or self[key] != value:
+            self.dirty = True
+        super().__setitem__(key, value)
 
 
-signal.signal(signal.SIGTERM, handle_signal)
-signal.signal(signal.SIGINT, handle_signal)
+# 需要做间隔计算的时间字段：文件中保存墙上时间以便跨重启使用，运行时换算为 time.monotonic() 的时间，
+# 避免 NTP 校时等导致系统时间跳变时误判通知间隔
+TIME_KEYS = ("last_alert_time", "last_healthy_notify_time")
 
 
 def load_state():
     """加载持久化状态"""
+    state = {
+        "last_unhealthy": [],
+        "last_alert_time": 0,
+        "last_healthy_notify_time": 0,
+    }
     if STATE_FILE.exists():
         try:
             with open(STATE_FILE, "r") as state_file:
-                return json.load(state_file)
+                state.update(json.load(state_file))
         except (json.JSONDecodeError, IOError):
             pass
-    return {
-        "last_unhealthy": [],
-        "last_alert_time": 0,
-        "last_healthy_notify_time": 0,
-    }
+
+    # 将墙上时间换算为单调时钟时间（距今的时长不会为负）
+    wall_now, mono_now = time.time(), time.monotonic()
+    for key in TIME_KEYS:
+        state[key] = mono_now - max(0.0, wall_now - state[key])
+    return MonitorState(state)
 
 
 def save_state(state):
-    """保存持久化状态"""
-    with open(STATE_FILE, "w") as state_file:
-        json.dump(state, state_file)
+    """保存持久化状态：先写临时文件再原子替换，避免进程中断时留下不完整的文件"""
+    wall_now, mono_now = time.time(), time.monotonic()
+    data = dict(state)
+    for key in TIME_KEYS:
+        data[key] = wall_now - (mono_now - state[key])
 
+    tmp_file = STATE_FILE.with_suffix(".tmp")
+    tmp_file.write_text(json.dumps(data))
+    os.replace(tmp_file, STATE_FILE)
+    state.dirty = False
 
-def fetch_monitor_status():
+
+async def fetch_monitor_status(client):
     """获取监控状态"""
-    ctx = ssl.create_default_context()
-    request = urllib.request.Request(MONITOR_URL, headers={"Accept": "application/json"})
+    headers = {"Accept": "application/json"}
+    if _last_status["etag"] and _last_status["data"] is not None:
+        headers["If-None-Match"] = _last_status["etag"]
     try:
-        with urllib.request.urlopen(request, timeout=30, context=ctx) as response:
-            return json.loads(response.read().decode("utf-8"))
-    except urllib.error.URLError as error:
-        print(f"[{datetime.now()}] 请求监控接口失败: {error}")
+        response = await client.get(MONITOR_URL, headers=headers, timeout=30)
+        if response.status_code == 304:
+            # 服务状态没有变化，沿用上次的数据（通知间隔等判断仍照常进行）
+            return _last_status["data"]
+        response.raise_for_status()
+        status_data = json.loads(response.content)
+        _last_status["etag"] = response.headers.get("ETag")
+        _last_status["data"] = status_data
+        return status_data
+    except httpx.HTTPError as error:
+        logger.error(f"请求监控接口失败: {error}")
         return None
     except Exception as error:
-        print(f"[{datetime.now()}] 未知错误: {error}")
+        logger.error(f"未知错误: {error}")
         return None
 
 
+def _service_label(service):
+    """服务的展示名称：有描述时为“描述 (路径)”，否则为路径"""
+    path = service.get("path", "unknown")
+    description = service.get("description", "")
+    return f"{description} ({path})" if description else path
+
+
 def build_alert_body(status_data):
     """构建异常告警的 Markdown 通知内容"""
-    unhealthy = status_data.get("unhealthy_services", [])
-    total = status_data.get("total", 0)
-    healthy_count = status_data.get("healthy", 0)
-    unhealthy_count = status_data.get("unhealthy", 0)
-
-    lines = [
-        f"**总服务数**: {total} | 健康: {healthy_count} | 异常: {unhealthy_count}",
-        "",
-    ]
+    header = (
+        f"**总服务数**: {status_data.get('total', 0)} | "
+        f"健康: {status_data.get('healthy', 0)} | 异常: {status_data.get('unhealthy', 0)}\n"
+    )
+    return header + "".join(
+        f"\n- **{_service_label(service)}** -> `{service.get('target', 'unknown')}`"
+        f"\n  错误: {service.get('error', '未知错误')}"
+        for service in status_data.get("unhealthy_services", [])
+    )
 
-    for service in unhealthy:
-        path = service.get("path", "unknown")
-        target = service.get("target", "unknown")
-        description = service.get("description", "")
-        error_message = service.get("error", "未知错误")
-        label = f"{description} ({path})" if description else path
-        lines.append(f"- **{label}** -> `{target}`")
-        lines.append(f"  错误: {error_message}")
 
-    return "\n".join(lines)
+def _response_time_str(service):
+    """服务响应时间的展示文本，没有响应时间时为空"""
+    response_time = service.get("response_time_ms")
+    return f" ({response_time}ms)" if response_time else ""
 
 
 def build_healthy_body(status_data):
     """构建正常状态的 Markdown 通知内容"""
-    total = status_data.get("total", 0)
-    healthy_count = status_data.get("healthy", 0)
     avg_time = status_data.get("avg_response_time_ms")
-    services = status_data.get("services", [])
-
-    lines = [
-        f"**总服务数**: {total} | 全部健康: {healthy_count}",
-        "",
-    ]
-
-    for service in services:
-        path = service.get("path", "unknown")
-        description = service.get("description", "")
-        response_time = service.get("response_time_ms")
-        label = f"{description} ({path})" if description else path
-        time_str = f" ({response_time}ms)" if response_time else ""
-        lines.append(f"- **{label}**{time_str}")
-
+    body = (
+        f"**总服务数**: {status_data.get('total', 0)} | 全部健康: {status_data.get('healthy', 0)}\n"
+        + "".join(
+            f"\n- **{_service_label(service)}**{_response_time_str(service)}"
+            for service in status_data.get("services", [])
+        )
+    )
     if avg_time:
-        lines.append(f"\n**平均响应时间**: {avg_time}ms")
-
-    return "\n".join(lines)
+        body += f"\n\n**平均响应时间**: {avg_time}ms"
+    return body
 
 
-def send_ntfy_notification(title, body, priority="high", tags="warning,server"):
+async def send_ntfy_notification(client, title, body, priority="high", tags="warning,server"):
     """发送 ntfy 通知（Markdown 格式）"""
     url = f"{NTFY_URL}/{NTFY_TOPIC}"
 
@@ -153,33 +195,27 @@ def send_ntfy_notification(title, body, priority="high", tags="warning,server"):
         "Markdown": "yes",
     }
 
-    request = urllib.request.Request(
-        url,
-        data=body.encode("utf-8"),
-        headers=headers,
-        method="POST",
-    )
-
     try:
-        ctx = ssl.create_default_context()
-        with urllib.request.urlopen(request, timeout=15, context=ctx) as response:
-            print(f"[{datetime.now()}] ntfy 通知发送成功 (HTTP {response.status}) - {title}")
-            return True
+        response = await client.post(url, content=body.encode("utf-8"), headers=headers, timeout=15)
+        response.raise_for_status()
+        logger.info(f"ntfy 通知发送成功 (HTTP {response.status_code}) - {title}")
+        return True
     except Exception as error:
-        print(f"[{datetime.now()}] ntfy 通知发送失败: {error}")
+        logger.error(f"ntfy 通知发送失败: {error}")
         return False
 
 
-def check_and_notify(state):
+async def check_and_notify(client, state):
     """执行一次检查并根据策略发送通知"""
-    now = time.time()
-    status_data = fetch_monitor_status()
+    now = time.monotonic()
+    status_data = await fetch_monitor_status(client)
 
     # 监控接口不可达：按异常间隔发送通知
     if status_data is None:
-        time_since_last_alert = now - state.get("last_alert_time", 0)
+        time_since_last_alert = now - state["last_alert_time"]
         if time_since_last_alert >= ALERT_INTERVAL:
-            send_ntfy_notification(
+            await send_ntfy_notification(
+                client,
                 "监控接口不可达",
                 f"无法访问监控接口: `{MONITOR_URL}`\n\n请检查服务是否正常运行。",
                 priority="urgent",
@@ -188,7 +224,7 @@ def check_and_notify(state):
             state["last_alert_time"] = now
         else:
             remaining = int(ALERT_INTERVAL - time_since_last_alert)
-            print(f"[{datetime.now()}] 监控接口不可达，{remaining}s 后再次通知")
+            logger.warning(f"监控接口不可达，{remaining}s 后再次通知")
         return
 
     overall_status = status_data.get("overall_status", "unknown")
@@ -202,7 +238,8 @@ def check_and_notify(state):
         lines = ["以下服务已恢复正常：", ""]
         for service_path in recovered:
             lines.append(f"- **{service_path}**")
-        send_ntfy_notification(
+        await send_ntfy_notification(
+            client,
             "服务已恢复",
             "\n".join(lines),
             priority="default",
@@ -213,27 +250,28 @@ def check_and_notify(state):
     # 异常状态：每 ALERT_INTERVAL（10 分钟）通知一次，高优先级
     if overall_status != "healthy" and unhealthy_services:
         new_unhealthy = current_unhealthy_paths - previous_unhealthy_paths
-        time_since_last_alert = now - state.get("last_alert_time", 0)
+        time_since_last_alert = now - state["last_alert_time"]
 
         if new_unhealthy or time_since_last_alert >= ALERT_INTERVAL:
             title = "服务异常告警" if new_unhealthy else "服务持续异常"
             alert_tags = "rotating_light,server" if new_unhealthy else "warning,server"
             body = build_alert_body(status_data)
-            send_ntfy_notification(title, body, priority="high", tags=alert_tags)
+            await send_ntfy_notification(client, title, body, priority="high", tags=alert_tags)
             state["last_alert_time"] = now
         else:
             remaining = int(ALERT_INTERVAL - time_since_last_alert)
-            print(
-                f"[{datetime.now()}] 存在 {len(unhealthy_services)} 个异常服务，"
+            logger.warning(
+                f"存在 {len(unhealthy_services)} 个异常服务，"
                 f"{remaining}s 后再次通知"
             )
 
     # 正常状态：每 HEALTHY_INTERVAL（6 小时）通知一次，低优先级
     elif overall_status == "healthy":
-        time_since_last_healthy = now - state.get("last_healthy_notify_time", 0)
+        time_since_last_healthy = now - state["last_healthy_notify_time"]
         if time_since_last_healthy >= HEALTHY_INTERVAL:
             body = build_healthy_body(status_data)
-            send_ntfy_notification(
+            await send_ntfy_notification(
+                client,
                 "服务状态正常",
                 body,
                 priority="low",
@@ -242,41 +280,56 @@ def check_and_notify(state):
             state["last_healthy_notify_time"] = now
         else:
             total = status_data.get("total", 0)
-            print(f"[{datetime.now()}] 所有服务正常 (共 {total} 个)")
+            logger.info(f"所有服务正常 (共 {total} 个)")
 
-    # 更新状态
-    state["last_unhealthy"] = list(current_unhealthy_paths)
-    save_state(state)
+    # 更新状态（排序后保存，路径集合不变时不会被视为修改）
+    state["last_unhealthy"] = sorted(current_unhealthy_paths)
 
 
-def main():
+async def main():
+    # 时间戳由 logging 统一生成，无需每条输出都调用 datetime.now()
+    logging.basicConfig(level=logging.INFO, format="[%(asctime)s] %(message)s", stream=sys.stdout)
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
     if not NTFY_TOPIC:
-        print("错误: 请设置 NTFY_TOPIC 环境变量")
+        logger.error("请设置 NTFY_TOPIC 环境变量")
         sys.exit(1)
 
-    print(f"[{datetime.now()}] 监控脚本启动")
-    print(f"  监控地址: {MONITOR_URL}")
-    print(f"  ntfy 主题: {NTFY_TOPIC}")
-    print(f"  检查间隔: {CHECK_INTERVAL}s")
-    print(f"  异常通知间隔: {ALERT_INTERVAL}s ({ALERT_INTERVAL // 60} 分钟)")
-    print(f"  正常通知间隔: {HEALTHY_INTERVAL}s ({HEALTHY_INTERVAL // 3600} 小时)")
+    logger.info("监控脚本启动")
+    logger.info(f"  监控地址: {MONITOR_URL}")
+    logger.info(f"  ntfy 主题: {NTFY_TOPIC}")
+    logger.info(f"  检查间隔: {CHECK_INTERVAL}s")
+    logger.info(f"  异常通知间隔: {ALERT_INTERVAL}s ({ALERT_INTERVAL // 60} 分钟)")
+    logger.info(f"  正常通知间隔: {HEALTHY_INTERVAL}s ({HEALTHY_INTERVAL // 3600} 小时)")
+
+    logger.info(f"  HTTP/2: {'启用' if HTTP2_ENABLED else '未启用（未安装 h2）'}")
+
+    # 收到信号时直接唤醒等待中的循环，无需逐秒轮询
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signum, handle_signal, signum, stop_event)
 
     state = load_state()
 
-    while running:
-        try:
-            check_and_notify(state)
-        except Exception as error:
-            print(f"[{datetime.now()}] 检查异常: {error}")
+    # 复用同一个客户端，跨轮次保持到监控接口和 ntfy 的连接
+    async with httpx.AsyncClient(http2=HTTP2_ENABLED, verify=_SSL_CTX) as client:
+        while not stop_event.is_set():
+            try:
+                await check_and_notify(client, state)
+                # 只有状态发生变化时才写文件，全部正常时通常无需写入
+                if state.dirty:
+                    save_state(state)
+            except Exception:
+                logger.exception("检查异常")
 
-        # 逐秒 sleep，以便信号能及时中断退出
-        for _ in range(CHECK_INTERVAL):
-            if not running:
-                break
-            time.sleep(1)
+            try:
+                await asyncio.wait_for(stop_event.wait(), timeout=CHECK_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
 
-    print(f"[{datetime.now()}] 监控脚本已退出")
+    logger.info("监控脚本已退出")
 
 
 if __name__ == "__main__":
-    main()
+    asyncio.run(main())
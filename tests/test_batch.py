@@ -0,0 +1,39 @@
+"""
+批量规则修改测试
+"""
+import tempfile
+import unittest
+from pathlib import Path
+
+from app.config_manager import ConfigManager
+from app.models import ProxyRule
+
+
+class ApplyBatchTest(unittest.TestCase):
+    """ConfigManager.apply_batch 的部分失败场景"""
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.config_manager = ConfigManager(str(Path(self._tmp.name) / "proxy_config.yaml"))
+        self.rule = self.config_manager.add_rule(ProxyRule(path="/a", target_port=8001))
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_failed_update_is_not_written_with_successful_add(self):
+        results = self.config_manager.apply_batch([
+            ("update", self.rule.id, {"path": "/x y"}),
+            ("add", ProxyRule(path="/b", target_port=8002)),
+        ])
+
+        self.assertIsInstance(results[0], ValueError)
+        self.assertIsInstance(results[1], ProxyRule)
+
+        # 重新从磁盘读取，失败的修改不应写入文件
+        rules = {rule.path: rule for rule in ConfigManager(str(self.config_manager.config_path)).get_all_rules()}
+        self.assertEqual(sorted(rules), ["/a", "/b"])
+        self.assertEqual(rules["/a"].id, self.rule.id)
+
+
+if __name__ == "__main__":
+    unittest.main()